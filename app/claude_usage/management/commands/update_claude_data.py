@@ -1,7 +1,14 @@
-from django.core.management.base import BaseCommand
-from django.utils.dateparse import parse_datetime
-from app.claude_usage.services import ClaudeDataExtractor
-from app.claude_usage.models import Project, Session, UsageSnapshot
+import fcntl
+import os
+import shelve
+from contextlib import contextmanager, nullcontext
+
+from celery import group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from app.claude_usage.services import ClaudeDataExtractor, import_usage_data
+from app.claude_usage.models import UsageSnapshot
+from app.claude_usage.tasks import ingest_project
 
 
 class Command(BaseCommand):
@@ -17,161 +24,161 @@ class Command(BaseCommand):
         parser.add_argument(
             "--verbose", action="store_true", help="Enable verbose output"
         )
+        parser.add_argument(
+            "--full-reload",
+            action="store_true",
+            help=(
+                "Drop the UsageSnapshot indexes while snapshots are replaced and "
+                "rebuild them in the same transaction (faster for large imports). "
+                "The snapshot table is locked until the import commits, so run "
+                "it while the API is offline"
+            ),
+        )
+        parser.add_argument(
+            "--cache-file",
+            type=str,
+            default=None,
+            help=(
+                "Keep parsed session files in this shelve file between runs so "
+                "unchanged files are not parsed again. Only one run may use a "
+                "given file at a time"
+            ),
+        )
+        parser.add_argument(
+            "--celery",
+            action="store_true",
+            dest="use_celery",
+            help="Queue one Celery task per project instead of importing inline",
+        )
+        parser.add_argument(
+            "--wait",
+            action="store_true",
+            help="With --celery, wait for the queued tasks and print totals",
+        )
+
+    @contextmanager
+    def open_cache_file(self, cache_file):
+        """Open the shelve parse cache once for this run, refusing other writers."""
+        path = os.path.expanduser(cache_file)
+        with open(f"{path}.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise CommandError(
+                    f"{cache_file} is in use by another update_claude_data run"
+                )
+            with shelve.open(path) as cache:
+                yield cache
+
+    @contextmanager
+    def deferred_snapshot_indexes(self, verbose=False):
+        """Drop UsageSnapshot's Meta indexes for the duration of the block.
+
+        Use inside the import's transaction: the drop and the rebuild commit
+        with the import, and a failed import rolls the drop back.
+        """
+        if connection.vendor == "sqlite":
+            # SQLite's schema editor cannot be used inside a transaction, so
+            # the indexes are kept there
+            yield
+            return
+
+        indexes = UsageSnapshot._meta.indexes
+        with connection.schema_editor(atomic=False) as editor:
+            for index in indexes:
+                editor.remove_index(UsageSnapshot, index)
+        if verbose:
+            self.stdout.write(f"Dropped {len(indexes)} snapshot indexes")
+
+        yield
+
+        # PostgreSQL refuses CREATE INDEX while the import's deferred foreign
+        # key checks are pending, so run them now
+        connection.check_constraints()
+        with connection.schema_editor(atomic=False) as editor:
+            for index in indexes:
+                editor.add_index(UsageSnapshot, index)
+        if verbose:
+            self.stdout.write(f"Rebuilt {len(indexes)} snapshot indexes")
 
     def handle(self, *args, **options):
         claude_path = options["claude_path"]
         verbose = options["verbose"]
+        full_reload = options["full_reload"]
+
+        if options["use_celery"]:
+            if full_reload or options["cache_file"]:
+                raise CommandError(
+                    "--full-reload and --cache-file cannot be combined with --celery"
+                )
+            return self.dispatch_to_celery(claude_path, options["wait"])
 
         self.stdout.write(f"Updating Claude usage data from {claude_path}")
 
         try:
-            extractor = ClaudeDataExtractor(claude_path)
-            data = extractor.extract_usage_data()
+            cache_context = (
+                self.open_cache_file(options["cache_file"])
+                if options["cache_file"]
+                else nullcontext()
+            )
+            with cache_context as persistent_cache:
+                extractor = ClaudeDataExtractor(
+                    claude_path, persistent_cache=persistent_cache
+                )
+                data = extractor.extract_usage_data()
 
             if not data:
                 self.stdout.write(self.style.WARNING("No Claude data found"))
                 return
 
-            projects_updated = 0
-            sessions_updated = 0
-            snapshots_created = 0
-
-            for project_data in data:
-                project, created = Project.objects.get_or_create(
-                    name=project_data["project_name"],
-                    defaults={
-                        "path": f"{claude_path}/projects/{project_data['project_name']}"
-                    },
+            index_context = (
+                self.deferred_snapshot_indexes(verbose)
+                if full_reload
+                else nullcontext()
+            )
+            with transaction.atomic(), index_context:
+                counts = import_usage_data(
+                    data,
+                    claude_path=claude_path,
+                    log=self.stdout.write if verbose else None,
                 )
 
-                if created:
-                    projects_updated += 1
-                    if verbose:
-                        self.stdout.write(f"Created new project: {project.name}")
-
-                for session_data in project_data["sessions"]:
-                    # Parse timestamp from first message
-                    created_at = None
-                    if session_data["messages"]:
-                        try:
-                            created_at = parse_datetime(
-                                session_data["messages"][0]["timestamp"].replace(
-                                    "Z", "+00:00"
-                                )
-                            )
-                        except (ValueError, TypeError):
-                            pass
-
-                    session, created = Session.objects.get_or_create(
-                        session_id=session_data["session_id"],
-                        project=project,
-                        defaults={
-                            "message_count": session_data["message_count"],
-                            "total_tokens": session_data["total_tokens"],
-                            "total_input_tokens": session_data["total_input_tokens"],
-                            "total_output_tokens": session_data["total_output_tokens"],
-                            "total_cache_creation_tokens": session_data[
-                                "total_cache_creation_tokens"
-                            ],
-                            "total_cache_read_tokens": session_data[
-                                "total_cache_read_tokens"
-                            ],
-                            "created_at": created_at,
-                        },
-                    )
-
-                    if created:
-                        sessions_updated += 1
-                        if verbose:
-                            self.stdout.write(
-                                f"Created new session: {session.session_id}"
-                            )
-                    else:
-                        # Update existing session with latest data
-                        session.message_count = session_data["message_count"]
-                        session.total_tokens = session_data["total_tokens"]
-                        session.total_input_tokens = session_data["total_input_tokens"]
-                        session.total_output_tokens = session_data[
-                            "total_output_tokens"
-                        ]
-                        session.total_cache_creation_tokens = session_data[
-                            "total_cache_creation_tokens"
-                        ]
-                        session.total_cache_read_tokens = session_data[
-                            "total_cache_read_tokens"
-                        ]
-                        session.save()
-
-                    # Clear existing usage snapshots for this session to avoid duplicates
-                    existing_snapshots = UsageSnapshot.objects.filter(
-                        session=session
-                    ).count()
-                    if existing_snapshots > 0:
-                        UsageSnapshot.objects.filter(session=session).delete()
-                        if verbose:
-                            self.stdout.write(
-                                f"Removed {existing_snapshots} existing snapshots for session {session.session_id}"
-                            )
-
-                    # Create usage snapshots for each message
-                    for message in session_data["messages"]:
-                        try:
-                            timestamp = parse_datetime(
-                                message["timestamp"].replace("Z", "+00:00")
-                            )
-                            total_tokens = sum(
-                                [
-                                    message["message"]["usage"].get("input_tokens", 0),
-                                    message["message"]["usage"].get("output_tokens", 0),
-                                    message["message"]["usage"].get(
-                                        "cache_creation_input_tokens", 0
-                                    ),
-                                    message["message"]["usage"].get(
-                                        "cache_read_input_tokens", 0
-                                    ),
-                                ]
-                            )
-
-                            UsageSnapshot.objects.create(
-                                session=session,
-                                project=project,
-                                input_tokens=message["message"]["usage"].get(
-                                    "input_tokens", 0
-                                ),
-                                output_tokens=message["message"]["usage"].get(
-                                    "output_tokens", 0
-                                ),
-                                cache_creation_tokens=message["message"]["usage"].get(
-                                    "cache_creation_input_tokens", 0
-                                ),
-                                cache_read_tokens=message["message"]["usage"].get(
-                                    "cache_read_input_tokens", 0
-                                ),
-                                total_tokens=total_tokens,
-                                cost_usd=extractor.calculate_cost(message),
-                                model=message["message"]["model"],
-                                timestamp=timestamp,
-                                request_id=message.get("requestId", ""),
-                                message_id=message["message"].get("id", ""),
-                            )
-                            snapshots_created += 1
-                        except (KeyError, ValueError, TypeError) as e:
-                            if verbose:
-                                self.stdout.write(
-                                    self.style.WARNING(
-                                        f"Skipping malformed message: {e}"
-                                    )
-                                )
-
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Successfully updated Claude data:\n"
-                    f"  Projects: {projects_updated}\n"
-                    f"  Sessions: {sessions_updated}\n"
-                    f"  Usage snapshots: {snapshots_created}"
-                )
-            )
+            self.write_summary(counts)
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error updating Claude data: {e}"))
             raise
+
+    def dispatch_to_celery(self, claude_path, wait):
+        """Queue one ingest_project task per project directory."""
+        projects = ClaudeDataExtractor(claude_path).get_all_projects()
+
+        if not projects:
+            self.stdout.write(self.style.WARNING("No Claude data found"))
+            return
+
+        result = group(
+            ingest_project.s(project, claude_path) for project in projects
+        ).apply_async()
+        self.stdout.write(f"Queued {len(projects)} project ingest tasks")
+
+        if wait:
+            counts = {
+                "projects_created": 0,
+                "sessions_created": 0,
+                "snapshots_created": 0,
+            }
+            for task_counts in result.join():
+                for key in counts:
+                    counts[key] += task_counts.get(key, 0)
+            self.write_summary(counts)
+
+    def write_summary(self, counts):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully updated Claude data:\n"
+                f"  Projects: {counts['projects_created']}\n"
+                f"  Sessions: {counts['sessions_created']}\n"
+                f"  Usage snapshots: {counts['snapshots_created']}"
+            )
+        )
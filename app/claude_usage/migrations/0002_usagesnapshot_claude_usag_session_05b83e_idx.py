@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("claude_usage", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="usagesnapshot",
+            index=models.Index(
+                fields=["session", "timestamp"], name="claude_usag_session_05b83e_idx"
+            ),
+        ),
+    ]
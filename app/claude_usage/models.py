@@ -73,6 +73,7 @@ class UsageSnapshot(models.Model):
             models.Index(fields=["timestamp"]),
             models.Index(fields=["model"]),
             models.Index(fields=["project", "timestamp"]),
+            models.Index(fields=["session", "timestamp"]),
         ]
 
     def __str__(self):
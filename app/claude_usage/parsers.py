@@ -0,0 +1,21 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class OrjsonParser(BaseParser):
+    """
+    JSON parser for large agent payloads.
+
+    DRF's JSONParser decodes the body into a str before json.load() walks
+    it; orjson parses the raw bytes directly, so the decoded copy of a
+    multi-megabyte payload is never made.
+    """
+
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -1,53 +1,807 @@
 import os
-import json
-import glob
+import functools
+import io
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
+import orjson
+from django.db import connection
+from django.db.models import F, Q, QuerySet, Window
+from django.db.models.functions import Lag
 from django.utils import timezone
+from .models import Project, Session, UsageSnapshot
+
+# Every assistant entry contains this token (as the "type" value); lines
+# without it can be rejected without running the JSON parser.
+ASSISTANT_MARKER = b'"assistant"'
+
+
+# Remaining file size above which session files are scanned through mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+# Upper bound on threads used to parse one project's session files
+MAX_PARSE_WORKERS = min(8, os.cpu_count() or 1)
+
+# Parsed sessions shared by every extractor in this process, keyed by file
+# path. Entries hold the file's mtime and size when parsed, the offset after
+# its last complete line, and the messages read so far. Web and worker
+# processes are long-lived, so only the most recently used
+# SESSION_CACHE_MAX_ENTRIES files are kept.
+SESSION_CACHE_MAX_ENTRIES = 256
+_SESSION_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_SESSION_CACHE_LOCK = threading.Lock()
+
+# Project directory listings per projects_path, as (monotonic time, names)
+PROJECTS_CACHE_TTL = 5.0
+_PROJECTS_CACHE: Dict[str, Tuple[float, List[str]]] = {}
+
+# Fields kept from each assistant log entry (see slim_message)
+ENTRY_FIELDS = ("type", "sessionId", "timestamp", "requestId")
+MESSAGE_FIELDS = ("id", "model")
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+# Per-session aggregates copied verbatim from the extractor output
+SESSION_TOTAL_FIELDS = (
+    "message_count",
+    "total_tokens",
+    "total_input_tokens",
+    "total_output_tokens",
+    "total_cache_creation_tokens",
+    "total_cache_read_tokens",
+)
+
+# Claude pricing per 1K tokens as (input, output, cache_creation,
+# cache_read) (approximate, may need updating)
+MODEL_PRICING = {
+    "claude-sonnet-4-20250514": (0.015, 0.075, 0.0375, 0.00375),
+    "claude-3-5-sonnet-20241022": (0.003, 0.015, 0.0075, 0.00075),
+}
+DEFAULT_PRICING_MODEL = "claude-sonnet-4-20250514"
+
+# Columns that identify an unchanged snapshot between imports
+SNAPSHOT_DIFF_FIELDS = (
+    "message_id",
+    "request_id",
+    "timestamp",
+    "model",
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_tokens",
+    "cache_read_tokens",
+    "cost_usd",
+)
+# Scale of UsageSnapshot.cost_usd; PostgreSQL numeric rounds half away
+# from zero, so costs are rounded the same way before they are stored
+COST_QUANTUM = Decimal("0.000001")
+
+# Columns written by insert_snapshots, in COPY order
+SNAPSHOT_COPY_FIELDS = (
+    "project",
+    "session",
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_tokens",
+    "cache_read_tokens",
+    "total_tokens",
+    "cost_usd",
+    "model",
+    "timestamp",
+    "request_id",
+    "message_id",
+)
+
+# Rows fetched per round-trip when a snapshot scan is streamed with iterator()
+SNAPSHOT_ITERATOR_CHUNK_SIZE = 5000
+
+
+def slim_message(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Reduce a parsed log entry to the fields used for usage tracking.
+
+    Returns None for anything that is not an assistant message with usage.
+    The nested shape of Claude's entries is kept so callers can keep using
+    message["message"]["usage"], but content blocks and other metadata are
+    dropped instead of being held in memory for every message.
+    """
+    if not isinstance(data, dict) or data.get("type") != "assistant":
+        return None
+    body = data.get("message")
+    if not isinstance(body, dict) or not isinstance(body.get("usage"), dict):
+        return None
+
+    usage = body["usage"]
+    slim_body = {key: body[key] for key in MESSAGE_FIELDS if key in body}
+    slim_body["usage"] = {key: usage[key] for key in USAGE_FIELDS if key in usage}
+    slim = {key: data[key] for key in ENTRY_FIELDS if key in data}
+    slim["message"] = slim_body
+    return slim
+
+
+def usage_totals(messages: List[Dict[str, Any]]) -> Tuple[int, int, int, int]:
+    """
+    Sum input, output, cache creation and cache read tokens over messages.
+
+    All four counters are accumulated in one pass over the list.
+    """
+    total_input = total_output = total_cache_creation = total_cache_read = 0
+    for message in messages:
+        usage = message["message"]["usage"]
+        total_input += usage.get("input_tokens", 0)
+        total_output += usage.get("output_tokens", 0)
+        total_cache_creation += usage.get("cache_creation_input_tokens", 0)
+        total_cache_read += usage.get("cache_read_input_tokens", 0)
+    return total_input, total_output, total_cache_creation, total_cache_read
+
+
+def session_summary(session_id: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the session dict import_usage_data expects, totals included"""
+    total_input, total_output, total_cache_creation, total_cache_read = usage_totals(
+        messages
+    )
+    return {
+        "session_id": session_id,
+        "message_count": len(messages),
+        "total_input_tokens": total_input,
+        "total_output_tokens": total_output,
+        "total_cache_creation_tokens": total_cache_creation,
+        "total_cache_read_tokens": total_cache_read,
+        "total_tokens": total_input
+        + total_output
+        + total_cache_creation
+        + total_cache_read,
+        "messages": messages,
+    }
+
+
+def token_cost(
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_creation_tokens: int,
+    cache_read_tokens: int,
+) -> float:
+    """Price one message's tokens; unknown models use DEFAULT_PRICING_MODEL"""
+    input_rate, output_rate, cache_creation_rate, cache_read_rate = (
+        MODEL_PRICING.get(model) or MODEL_PRICING[DEFAULT_PRICING_MODEL]
+    )
+    return (
+        (input_tokens / 1000) * input_rate
+        + (output_tokens / 1000) * output_rate
+        + (cache_creation_tokens / 1000) * cache_creation_rate
+        + (cache_read_tokens / 1000) * cache_read_rate
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_claude_paths(claude_path: str) -> Tuple[str, str]:
+    """Expand a Claude data directory and return it with its projects path.
+
+    Views build a ClaudeDataExtractor per request, nearly always for the
+    same directory, so the expansion is done once per process.
+    """
+    expanded = os.path.expanduser(claude_path)
+    return expanded, os.path.join(expanded, "projects")
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp from Claude's logs, or None if invalid.
+
+    datetime.fromisoformat accepts the trailing "Z" on Python 3.11+, so no
+    string rewriting is needed before parsing. Datetimes, such as snapshot
+    timestamps read from the database, are returned unchanged.
+    """
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sort_by_timestamp(
+    messages: List[Dict[str, Any]],
+) -> List[Tuple[datetime, Dict[str, Any]]]:
+    """Pair messages with their parsed timestamp, sorted oldest first.
+
+    Each timestamp is parsed once; messages with an invalid timestamp are
+    dropped.
+    """
+    timed = []
+    for msg in messages:
+        msg_time = parse_timestamp(msg.get("timestamp"))
+        if msg_time is not None:
+            timed.append((msg_time, msg))
+    timed.sort(key=itemgetter(0))
+    return timed
+
+
+def insert_snapshots(snapshots: List[UsageSnapshot], batch_size: int = 500) -> int:
+    """Insert unsaved UsageSnapshot rows and return how many were written.
+
+    On PostgreSQL the rows are streamed with COPY FROM STDIN, which avoids
+    per-row INSERT parsing for large imports. Other backends fall back to
+    bulk_create.
+    """
+    if not snapshots:
+        return 0
+
+    if connection.vendor != "postgresql":
+        UsageSnapshot.objects.bulk_create(snapshots, batch_size=batch_size)
+        return len(snapshots)
+
+    opts = UsageSnapshot._meta
+    columns = ", ".join(
+        connection.ops.quote_name(opts.get_field(name).column)
+        for name in SNAPSHOT_COPY_FIELDS
+    )
+
+    # copy_expert is not routed through Django's cursor wrapper, so map driver
+    # errors to django.db exceptions the same way bulk_create would
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(opts.db_table)} ({columns}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            snapshot_copy_buffer(snapshots),
+        )
+    return len(snapshots)
+
+
+def copy_field(value: Any) -> str:
+    """Format one value as a PostgreSQL CSV field.
+
+    Numbers are written bare and everything else is quoted, so empty
+    request/message ids stay "" rather than NULL. None is left as an
+    unquoted empty field, which COPY reads as NULL.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def snapshot_copy_buffer(snapshots: List[UsageSnapshot]) -> io.StringIO:
+    """Write SNAPSHOT_COPY_FIELDS of each snapshot as CSV for COPY FROM STDIN"""
+    opts = UsageSnapshot._meta
+    attnames = [opts.get_field(name).attname for name in SNAPSHOT_COPY_FIELDS]
+
+    buffer = io.StringIO()
+    for snapshot in snapshots:
+        fields = (copy_field(getattr(snapshot, attname)) for attname in attnames)
+        buffer.write(",".join(fields) + "\n")
+    buffer.seek(0)
+    return buffer
+
+
+def quantize_cost(cost: Any) -> Decimal:
+    """Round a cost to the stored cost_usd scale.
+
+    Floats are converted through their repr, which is the text PostgreSQL
+    would receive, and rounded half up like numeric does.
+    """
+    if not isinstance(cost, Decimal):
+        cost = Decimal(repr(cost))
+    return cost.quantize(COST_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+def snapshot_key(session_id: int, values: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """Build a comparable key from a session id and SNAPSHOT_DIFF_FIELDS values"""
+    values = list(values)
+    values[-1] = quantize_cost(values[-1])
+    return (session_id, *values)
+
+
+def diff_snapshots(
+    snapshots: List[UsageSnapshot], session_ids: List[int], batch_size: int = 500
+) -> Tuple[List[UsageSnapshot], List[int]]:
+    """Compare parsed snapshots with the stored rows of the given sessions.
+
+    Returns the snapshots that are not stored yet and the ids of stored rows
+    that no longer match a parsed message. Identical rows, including
+    repeated ones, are matched one to one and left untouched.
+    """
+    stored: Dict[Tuple[Any, ...], List[int]] = {}
+    for start in range(0, len(session_ids), batch_size):
+        rows = UsageSnapshot.objects.filter(
+            session_id__in=session_ids[start : start + batch_size]
+        ).values_list("id", "session_id", *SNAPSHOT_DIFF_FIELDS)
+        for row_id, session_id, *values in rows.iterator(
+            chunk_size=SNAPSHOT_ITERATOR_CHUNK_SIZE
+        ):
+            stored.setdefault(snapshot_key(session_id, values), []).append(row_id)
+
+    new_snapshots = []
+    for snapshot in snapshots:
+        key = snapshot_key(
+            snapshot.session_id,
+            [getattr(snapshot, field) for field in SNAPSHOT_DIFF_FIELDS],
+        )
+        if stored.get(key):
+            stored[key].pop()
+        else:
+            new_snapshots.append(snapshot)
+
+    stale_ids = [row_id for ids in stored.values() for row_id in ids]
+    return new_snapshots, stale_ids
+
+
+def upsert_projects(
+    data: List[Dict[str, Any]],
+    claude_path: str,
+    batch_size: int,
+    log: Callable[[str], None],
+) -> Tuple[Dict[str, Project], int]:
+    """Lock or create the projects named in data.
+
+    Returns the projects by name and how many rows this call inserted.
+    Rows are locked in primary key order so overlapping imports cannot
+    deadlock.
+    """
+    project_names = [p["project_name"] for p in data]
+    project_paths = {p["project_name"]: p.get("path") for p in data}
+    locked_projects = (
+        Project.objects.select_for_update()
+        .filter(name__in=project_names)
+        .order_by("pk")
+    )
+    projects = {project.name: project for project in locked_projects}
+    new_projects = [
+        Project(
+            name=name,
+            path=project_paths[name] or f"{claude_path}/projects/{name}",
+        )
+        for name in project_names
+        if name not in projects
+    ]
+    if not new_projects:
+        return projects, 0
+
+    Project.objects.bulk_create(
+        new_projects, batch_size=batch_size, ignore_conflicts=True
+    )
+    projects = {project.name: project for project in locked_projects.all()}
+
+    # A concurrent import may have inserted some of the names first; only
+    # rows carrying the created_at stamped on our instances are ours
+    projects_created = 0
+    for project in new_projects:
+        if projects[project.name].created_at == project.created_at:
+            projects_created += 1
+            log(f"Created new project: {project.name}")
+    return projects, projects_created
+
+
+def upsert_sessions(
+    data: List[Dict[str, Any]],
+    projects: Dict[str, Project],
+    batch_size: int,
+    log: Callable[[str], None],
+) -> Tuple[Dict[Tuple[str, int], Session], Dict[Tuple[str, int], Tuple], int]:
+    """Insert new sessions and refresh the totals of stored ones.
+
+    Returns the saved sessions and, under the same (session_id, project_id)
+    keys, each session's (project, session_data, parsed timestamps), along
+    with the number of sessions created.
+    """
+    # Existing keys are only needed to report which sessions are new
+    existing_keys = set(
+        Session.objects.filter(project__in=projects.values()).values_list(
+            "session_id", "project_id"
+        )
+    )
+    sessions = {}
+    session_rows = {}
+    now = timezone.now()
+
+    for project_data in data:
+        project = projects[project_data["project_name"]]
+
+        for session_data in project_data["sessions"]:
+            # Parse every timestamp once; the first one doubles as the
+            # session's created_at
+            timestamps = [
+                parse_timestamp(message.get("timestamp"))
+                for message in session_data["messages"]
+            ]
+            key = (session_data["session_id"], project.id)
+            totals = {field: session_data[field] for field in SESSION_TOTAL_FIELDS}
+
+            if key in sessions:
+                session = sessions[key]
+                for field, value in totals.items():
+                    setattr(session, field, value)
+            else:
+                sessions[key] = Session(
+                    session_id=session_data["session_id"],
+                    project=project,
+                    created_at=(timestamps[0] if timestamps else None) or now,
+                    **totals,
+                )
+
+            session_rows[key] = (project, session_data, timestamps)
+
+    if not sessions:
+        return sessions, session_rows, 0
+
+    # One INSERT ... ON CONFLICT per batch inserts new sessions and
+    # refreshes the totals of stored ones, keeping their created_at
+    Session.objects.bulk_create(
+        sessions.values(),
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["session_id", "project"],
+        update_fields=[*SESSION_TOTAL_FIELDS, "updated_at"],
+    )
+    new_keys = [key for key in sessions if key not in existing_keys]
+    for session_id, _project_id in new_keys:
+        log(f"Created new session: {session_id}")
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # Backends without RETURNING leave the upserted ids unset
+        sessions = {
+            (session.session_id, session.project_id): session
+            for session in Session.objects.filter(project__in=projects.values()).only(
+                "id", "session_id", "project_id"
+            )
+        }
+    return sessions, session_rows, len(new_keys)
+
+
+def build_snapshot(
+    session: Session,
+    project: Project,
+    message: Dict[str, Any],
+    timestamp: datetime,
+) -> UsageSnapshot:
+    """Build an unsaved UsageSnapshot for one parsed assistant message.
+
+    Raises KeyError, ValueError or TypeError for malformed messages.
+    """
+    body = message["message"]
+    usage = body["usage"]
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cache_creation = usage.get("cache_creation_input_tokens", 0)
+    cache_read = usage.get("cache_read_input_tokens", 0)
+    model = body.get("model", "unknown")
+
+    return UsageSnapshot(
+        session=session,
+        project=project,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_creation_tokens=cache_creation,
+        cache_read_tokens=cache_read,
+        total_tokens=input_tokens + output_tokens + cache_creation + cache_read,
+        cost_usd=quantize_cost(
+            token_cost(
+                model,
+                input_tokens,
+                output_tokens,
+                cache_creation,
+                cache_read,
+            )
+        ),
+        model=model,
+        timestamp=timestamp,
+        request_id=message.get("requestId", ""),
+        message_id=body.get("id", ""),
+    )
+
+
+def sync_snapshots(
+    sessions: Dict[Tuple[str, int], Session],
+    session_rows: Dict[Tuple[str, int], Tuple],
+    batch_size: int,
+    log: Callable[[str], None],
+) -> int:
+    """Write the difference between parsed and stored snapshots.
+
+    Unchanged rows are kept, new ones inserted and outdated ones deleted.
+    Returns the number of snapshots inserted.
+    """
+    snapshots = []
+    for key, (project, session_data, timestamps) in session_rows.items():
+        session = sessions[key]
+
+        # Create usage snapshots for each message
+        for message, timestamp in zip(session_data["messages"], timestamps):
+            if timestamp is None:
+                log(
+                    "Skipping message with invalid timestamp: "
+                    f"{message.get('timestamp')!r}"
+                )
+                continue
+            try:
+                snapshots.append(build_snapshot(session, project, message, timestamp))
+            except (KeyError, ValueError, TypeError) as e:
+                log(f"Skipping malformed message: {e}")
+
+    # Only write the difference against what is already stored
+    session_ids = [sessions[key].id for key in session_rows]
+    new_snapshots, stale_ids = diff_snapshots(snapshots, session_ids, batch_size)
+    for start in range(0, len(stale_ids), batch_size):
+        UsageSnapshot.objects.filter(
+            id__in=stale_ids[start : start + batch_size]
+        ).delete()
+    if stale_ids:
+        log(f"Removed {len(stale_ids)} outdated snapshots")
+
+    return insert_snapshots(new_snapshots, batch_size=batch_size)
+
+
+def import_usage_data(
+    data: List[Dict[str, Any]],
+    claude_path: str = "~/.claude",
+    batch_size: int = 500,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, int]:
+    """Write extracted project data to the database.
+
+    data is a list of project dicts with "project_name", an optional "path"
+    and "sessions" as built by session_summary. Projects and sessions are
+    created or updated in bulk, and each session's snapshots are synced
+    with the rows parsed from its messages: unchanged rows are kept, new
+    ones inserted and outdated ones deleted. Returns
+    the number of projects, sessions and snapshots created. Progress and
+    skipped messages are reported through ``log`` when given.
+
+    Must run inside transaction.atomic(): the project rows are locked with
+    select_for_update so concurrent imports of a project run one at a time
+    instead of inserting the same new snapshots twice.
+    """
+    log = log or (lambda _message: None)
+
+    projects, projects_created = upsert_projects(data, claude_path, batch_size, log)
+    sessions, session_rows, sessions_created = upsert_sessions(
+        data, projects, batch_size, log
+    )
+    return {
+        "projects_created": projects_created,
+        "sessions_created": sessions_created,
+        "snapshots_created": sync_snapshots(sessions, session_rows, batch_size, log),
+    }
+
+
+def latest_snapshot_window(
+    snapshots: QuerySet, window_hours: int = 5
+) -> Optional[Dict[str, Any]]:
+    """Build the latest rate limit window from stored snapshots.
+
+    A message that follows a gap of at least one full window always opens
+    a new window, so only rows from the last such message onwards are
+    loaded. Earlier windows cannot affect where the latest one starts.
+    Returns None when there are no snapshots.
+    """
+    window_duration = timedelta(hours=window_hours)
+    anchor = (
+        snapshots.annotate(
+            previous=Window(Lag("timestamp"), order_by=F("timestamp").asc())
+        )
+        .filter(
+            Q(previous__isnull=True) | Q(timestamp__gte=F("previous") + window_duration)
+        )
+        .order_by("-timestamp")
+        .values_list("timestamp", flat=True)
+        .first()
+    )
+    if anchor is None:
+        return None
+
+    rows = (
+        snapshots.filter(timestamp__gte=anchor)
+        .order_by("timestamp")
+        .values_list(
+            "timestamp",
+            "input_tokens",
+            "output_tokens",
+            "cache_creation_tokens",
+            "cache_read_tokens",
+        )
+    )
+    # The rows are folded as they arrive instead of being cached as a list
+    return ClaudeDataExtractor.calculate_rate_limit_windows_from_rows(
+        rows.iterator(chunk_size=SNAPSHOT_ITERATOR_CHUNK_SIZE), window_hours
+    )[-1]
 
 
 class ClaudeDataExtractor:
-    def __init__(self, claude_path: str = "~/.claude"):
-        self.claude_path = os.path.expanduser(claude_path)
-        self.projects_path = os.path.join(self.claude_path, "projects")
+    def __init__(
+        self,
+        claude_path: str = "~/.claude",
+        persistent_cache: Optional[MutableMapping[str, Dict[str, Any]]] = None,
+    ):
+        self.claude_path, self.projects_path = resolve_claude_paths(claude_path)
+        # Optional open mapping, such as a shelve file owned by the caller,
+        # that keeps _SESSION_CACHE entries between runs
+        self.persistent_cache = persistent_cache
+        self._cache_lock = threading.Lock()
 
     def get_all_projects(self) -> List[str]:
-        """Get all project directories"""
-        if not os.path.exists(self.projects_path):
-            return []
+        """Get all project directories, listed at most every PROJECTS_CACHE_TTL"""
+        cached = _PROJECTS_CACHE.get(self.projects_path)
+        if cached and time.monotonic() - cached[0] < PROJECTS_CACHE_TTL:
+            return list(cached[1])
+
+        try:
+            with os.scandir(self.projects_path) as entries:
+                projects = [entry.name for entry in entries if entry.is_dir()]
+        except (FileNotFoundError, NotADirectoryError):
+            projects = []
+        _PROJECTS_CACHE[self.projects_path] = (time.monotonic(), projects)
+        return list(projects)
 
-        return [
-            d
-            for d in os.listdir(self.projects_path)
-            if os.path.isdir(os.path.join(self.projects_path, d))
-        ]
+    def clear_projects_cache(self) -> None:
+        """Forget the cached project listing so the next call rescans"""
+        _PROJECTS_CACHE.pop(self.projects_path, None)
 
     def get_project_sessions(self, project_name: str) -> List[str]:
         """Get all sessions for a project"""
         project_path = os.path.join(self.projects_path, project_name)
-        pattern = os.path.join(project_path, "*.jsonl")
-        return glob.glob(pattern)
+        try:
+            with os.scandir(project_path) as entries:
+                return [
+                    entry.path
+                    for entry in entries
+                    if entry.name.endswith(".jsonl")
+                    and not entry.name.startswith(".")
+                    and entry.is_file()
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            return []
 
     def parse_session_file(self, file_path: str) -> List[Dict[str, Any]]:
         """Parse a single session JSONL file"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return []
+
+        entry = self._get_cached_session(file_path)
+        if entry and (entry["mtime"], entry["size"]) == (
+            stat.st_mtime_ns,
+            stat.st_size,
+        ):
+            return entry["messages"] + entry["tail"]
+
+        if entry and stat.st_size >= entry["offset"]:
+            # Session logs are append-only: only parse what was added
+            new, tail, offset = self._read_messages(file_path, entry["offset"])
+            messages = entry["messages"] + new
+        else:
+            messages, tail, offset = self._read_messages(file_path)
+
+        self._set_cached_session(
+            file_path,
+            {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "offset": offset,
+                "messages": messages,
+                "tail": tail,
+            },
+        )
+        return messages + tail
+
+    def _get_cached_session(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Look up a parsed session in the process cache, then the persistent one"""
+        with _SESSION_CACHE_LOCK:
+            entry = _SESSION_CACHE.get(file_path)
+            if entry is not None:
+                _SESSION_CACHE.move_to_end(file_path)
+        if entry is None and self.persistent_cache is not None:
+            # shelve is not thread-safe and sessions are parsed in parallel
+            with self._cache_lock:
+                entry = self.persistent_cache.get(file_path)
+        return entry
+
+    def _set_cached_session(self, file_path: str, entry: Dict[str, Any]) -> None:
+        with _SESSION_CACHE_LOCK:
+            _SESSION_CACHE[file_path] = entry
+            _SESSION_CACHE.move_to_end(file_path)
+            while len(_SESSION_CACHE) > SESSION_CACHE_MAX_ENTRIES:
+                _SESSION_CACHE.popitem(last=False)
+        if self.persistent_cache is not None:
+            with self._cache_lock:
+                self.persistent_cache[file_path] = entry
+
+    def _read_messages(self, file_path: str, offset: int = 0):
+        """
+        Read assistant messages starting at a byte offset.
+
+        Returns (messages, tail, end_offset): messages from complete lines,
+        messages from a trailing line still being written, and the offset
+        just past the last complete line.
+        """
         messages = []
+        tail = []
+
+        def add(line, complete):
+            try:
+                data = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                return
+            message = slim_message(data)
+            if message is not None:
+                (messages if complete else tail).append(message)
+
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            if (
-                                data.get("type") == "assistant"
-                            ):  # Only assistant messages have usage
-                                messages.append(data)
-                        except json.JSONDecodeError:
-                            continue
-        except (IOError, OSError):
-            # Handle file access errors gracefully
-            pass
-        return messages
+            with open(file_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size - offset > MMAP_THRESHOLD:
+                    offset = self._scan_mapped_lines(f, size, offset, add)
+                else:
+                    offset = self._scan_lines(f, offset, add)
+        except (IOError, OSError, ValueError):
+            # Handle file access errors gracefully; the range is read again
+            # from the same offset next time, so drop any partial results
+            messages.clear()
+            tail.clear()
+        return messages, tail, offset
+
+    @staticmethod
+    def _scan_mapped_lines(f, size: int, offset: int, add) -> int:
+        """
+        Pass marker lines from offset onwards to add(line, complete).
+
+        The file is scanned through mmap for newlines and the marker so
+        skipped lines are never copied into bytes objects. Returns the
+        offset just past the last complete line.
+        """
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = offset
+            while pos < size:
+                end = mm.find(b"\n", pos)
+                complete = end >= 0
+                if not complete:
+                    end = size
+                if mm.find(ASSISTANT_MARKER, pos, end) >= 0:
+                    add(mm[pos:end], complete)
+                pos = end + 1
+                if complete:
+                    offset = pos
+        return offset
+
+    @staticmethod
+    def _scan_lines(f, offset: int, add) -> int:
+        """
+        Pass marker lines from offset onwards to add(line, complete).
+
+        Returns the offset just past the last complete line.
+        """
+        f.seek(offset)
+        for line in f:
+            complete = line.endswith(b"\n")
+            if complete:
+                offset += len(line)
+            # Cheap substring check before decoding: most lines are
+            # user/tool entries that would be thrown away after parsing.
+            # The "type" key sits at the end of Claude's log lines, so the
+            # whole line is scanned rather than a fixed prefix.
+            if ASSISTANT_MARKER in line:
+                add(line, complete)
+        return offset
 
     def get_project_data(self, project_name: str) -> Optional[Dict[str, Any]]:
         """Get detailed data for a specific project"""
@@ -56,46 +810,29 @@ class ClaudeDataExtractor:
 
         project_data = {"project_name": project_name, "sessions": []}
 
-        for session_file in self.get_project_sessions(project_name):
-            messages = self.parse_session_file(session_file)
-
-            if not messages:
-                continue
+        session_files = self.get_project_sessions(project_name)
+        if len(session_files) > 1:
+            # File reads release the GIL, so independent sessions overlap well.
+            # map() keeps results in the same order as session_files.
+            workers = min(MAX_PARSE_WORKERS, len(session_files))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                sessions = list(executor.map(self._process_session, session_files))
+        else:
+            sessions = [self._process_session(path) for path in session_files]
 
-            # Calculate session totals
-            total_input = sum(
-                m["message"]["usage"].get("input_tokens", 0) for m in messages
-            )
-            total_output = sum(
-                m["message"]["usage"].get("output_tokens", 0) for m in messages
-            )
-            total_cache_creation = sum(
-                m["message"]["usage"].get("cache_creation_input_tokens", 0)
-                for m in messages
-            )
-            total_cache_read = sum(
-                m["message"]["usage"].get("cache_read_input_tokens", 0)
-                for m in messages
-            )
+        project_data["sessions"] = [s for s in sessions if s is not None]
+        return project_data
 
-            session_data = {
-                "session_id": messages[0].get("sessionId", "unknown"),
-                "file_path": session_file,
-                "message_count": len(messages),
-                "total_input_tokens": total_input,
-                "total_output_tokens": total_output,
-                "total_cache_creation_tokens": total_cache_creation,
-                "total_cache_read_tokens": total_cache_read,
-                "total_tokens": total_input
-                + total_output
-                + total_cache_creation
-                + total_cache_read,
-                "messages": messages,
-            }
+    def _process_session(self, session_file: str) -> Optional[Dict[str, Any]]:
+        """Parse one session file and compute its totals"""
+        messages = self.parse_session_file(session_file)
 
-            project_data["sessions"].append(session_data)
+        if not messages:
+            return None
 
-        return project_data
+        summary = session_summary(messages[0].get("sessionId", "unknown"), messages)
+        summary["file_path"] = session_file
+        return summary
 
     def extract_usage_data(self) -> List[Dict[str, Any]]:
         """Extract all usage data"""
@@ -112,93 +849,39 @@ class ClaudeDataExtractor:
         """Get overall usage statistics"""
         data = self.extract_usage_data()
 
-        # Calculate totals
-        total_tokens = sum(
-            session["total_tokens"]
-            for project in data
-            for session in project["sessions"]
-        )
-
-        total_input_tokens = sum(
-            session["total_input_tokens"]
-            for project in data
-            for session in project["sessions"]
-        )
-
-        total_output_tokens = sum(
-            session["total_output_tokens"]
-            for project in data
-            for session in project["sessions"]
-        )
-
-        total_cache_creation_tokens = sum(
-            session["total_cache_creation_tokens"]
-            for project in data
-            for session in project["sessions"]
-        )
-
-        total_cache_read_tokens = sum(
-            session["total_cache_read_tokens"]
-            for project in data
-            for session in project["sessions"]
-        )
-
-        total_sessions = sum(len(project["sessions"]) for project in data)
-
-        total_messages = sum(
-            session["message_count"]
-            for project in data
-            for session in project["sessions"]
-        )
+        # Calculate all totals in one pass over the sessions
+        totals = dict.fromkeys(SESSION_TOTAL_FIELDS, 0)
+        total_sessions = 0
+        for project in data:
+            for session in project["sessions"]:
+                total_sessions += 1
+                for field in SESSION_TOTAL_FIELDS:
+                    totals[field] += session[field]
 
         return {
-            "total_tokens": total_tokens,
-            "total_input_tokens": total_input_tokens,
-            "total_output_tokens": total_output_tokens,
-            "total_cache_creation_tokens": total_cache_creation_tokens,
-            "total_cache_read_tokens": total_cache_read_tokens,
+            "total_tokens": totals["total_tokens"],
+            "total_input_tokens": totals["total_input_tokens"],
+            "total_output_tokens": totals["total_output_tokens"],
+            "total_cache_creation_tokens": totals["total_cache_creation_tokens"],
+            "total_cache_read_tokens": totals["total_cache_read_tokens"],
             "total_sessions": total_sessions,
-            "total_messages": total_messages,
+            "total_messages": totals["message_count"],
             "projects": len(data),
             "projects_data": data,
         }
 
     def calculate_cost(self, message: Dict[str, Any]) -> float:
         """Calculate cost for a message based on token usage and model"""
-        # Claude pricing (approximate, may need updating)
-        pricing = {
-            "claude-sonnet-4-20250514": {
-                "input": 0.015,  # per 1K tokens
-                "output": 0.075,  # per 1K tokens
-                "cache_creation": 0.0375,  # per 1K tokens
-                "cache_read": 0.00375,  # per 1K tokens
-            },
-            "claude-3-5-sonnet-20241022": {
-                "input": 0.003,
-                "output": 0.015,
-                "cache_creation": 0.0075,
-                "cache_read": 0.00075,
-            },
-        }
-
-        model = message["message"].get("model", "claude-sonnet-4-20250514")
+        model = message["message"].get("model", DEFAULT_PRICING_MODEL)
         usage = message["message"]["usage"]
 
-        if model not in pricing:
-            model = "claude-sonnet-4-20250514"
-
-        rates = pricing[model]
-
-        input_cost = (usage.get("input_tokens", 0) / 1000) * rates["input"]
-        output_cost = (usage.get("output_tokens", 0) / 1000) * rates["output"]
-        cache_creation_cost = (
-            usage.get("cache_creation_input_tokens", 0) / 1000
-        ) * rates["cache_creation"]
-        cache_read_cost = (usage.get("cache_read_input_tokens", 0) / 1000) * rates[
-            "cache_read"
-        ]
-
-        return input_cost + output_cost + cache_creation_cost + cache_read_cost
+        return token_cost(
+            model,
+            usage.get("input_tokens", 0),
+            usage.get("output_tokens", 0),
+            usage.get("cache_creation_input_tokens", 0),
+            usage.get("cache_read_input_tokens", 0),
+        )
 
     def calculate_rate_limit_windows(
         self, messages: List[Dict[str, Any]], window_hours: int = 5
@@ -211,60 +894,117 @@ class ClaudeDataExtractor:
         if not messages:
             return []
 
-        # Sort messages by timestamp
-        sorted_messages = sorted(
-            messages,
-            key=lambda m: datetime.fromisoformat(m["timestamp"].replace("Z", "+00:00")),
+        return self._build_windows(
+            sort_by_timestamp(messages), timedelta(hours=window_hours)
         )
 
-        windows = []
-        current_window = None
-        window_duration = timedelta(hours=window_hours)
+    @staticmethod
+    def calculate_rate_limit_windows_from_rows(
+        rows: Iterable[Tuple[datetime, int, int, int, int]],
+        window_hours: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """
+        Group usage rows into rate limit windows without building messages.
 
-        for msg in sorted_messages:
-            msg_time = datetime.fromisoformat(msg["timestamp"].replace("Z", "+00:00"))
+        rows are (timestamp, input, output, cache creation, cache read)
+        tuples sorted oldest first, such as a snapshot values_list(). Totals
+        are kept in local counters and written to a dict only when a window
+        closes.
+        """
+        window_duration = timedelta(hours=window_hours)
+        windows = []
+        window_start = window_end = None
+        input_tokens = output_tokens = cache_creation = cache_read = 0
 
-            # Start new window if needed
-            if current_window is None or msg_time >= current_window["end_time"]:
-                if current_window:
-                    windows.append(current_window)
+        def close_window():
+            windows.append(
+                {
+                    "start_time": window_start,
+                    "end_time": window_end,
+                    "total_tokens": input_tokens
+                    + output_tokens
+                    + cache_creation
+                    + cache_read,
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "cache_creation_tokens": cache_creation,
+                    "cache_read_tokens": cache_read,
+                }
+            )
 
-                # Round start time down to the hour
-                window_start = msg_time.replace(minute=0, second=0, microsecond=0)
+        for row_time, row_input, row_output, row_creation, row_read in rows:
+            # Start new window if needed, rounding its start down to the hour
+            if window_end is None or row_time >= window_end:
+                if window_end is not None:
+                    close_window()
+                window_start = row_time.replace(minute=0, second=0, microsecond=0)
                 window_end = window_start + window_duration
+                input_tokens = output_tokens = cache_creation = cache_read = 0
+
+            input_tokens += row_input
+            output_tokens += row_output
+            cache_creation += row_creation
+            cache_read += row_read
+
+        # Add last window
+        if window_end is not None:
+            close_window()
+
+        return windows
+
+    @staticmethod
+    def _build_windows(
+        timed_messages: List[Tuple[datetime, Dict[str, Any]]],
+        window_duration: timedelta,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fold sorted (timestamp, message) pairs into window dicts.
+
+        Like calculate_rate_limit_windows_from_rows, but each window also
+        lists its messages.
+        """
+        windows = []
+        window_start = window_end = None
+        window_messages = []
+        input_tokens = output_tokens = cache_creation = cache_read = 0
 
-                current_window = {
+        def close_window():
+            windows.append(
+                {
                     "start_time": window_start,
                     "end_time": window_end,
-                    "messages": [],
-                    "total_tokens": 0,
-                    "input_tokens": 0,
-                    "output_tokens": 0,
-                    "cache_creation_tokens": 0,
-                    "cache_read_tokens": 0,
+                    "total_tokens": input_tokens
+                    + output_tokens
+                    + cache_creation
+                    + cache_read,
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "cache_creation_tokens": cache_creation,
+                    "cache_read_tokens": cache_read,
+                    "messages": window_messages,
                 }
+            )
+
+        for msg_time, msg in timed_messages:
+            # Start new window if needed, rounding its start down to the hour
+            if window_end is None or msg_time >= window_end:
+                if window_end is not None:
+                    close_window()
+                window_start = msg_time.replace(minute=0, second=0, microsecond=0)
+                window_end = window_start + window_duration
+                window_messages = []
+                input_tokens = output_tokens = cache_creation = cache_read = 0
 
-            # Add message to current window
-            current_window["messages"].append(msg)
+            window_messages.append(msg)
             usage = msg["message"]["usage"]
-            current_window["input_tokens"] += usage.get("input_tokens", 0)
-            current_window["output_tokens"] += usage.get("output_tokens", 0)
-            current_window["cache_creation_tokens"] += usage.get(
-                "cache_creation_input_tokens", 0
-            )
-            current_window["cache_read_tokens"] += usage.get(
-                "cache_read_input_tokens", 0
-            )
-            current_window["total_tokens"] = (
-                current_window["input_tokens"]
-                + current_window["output_tokens"]
-                + current_window["cache_creation_tokens"]
-                + current_window["cache_read_tokens"]
-            )
+            input_tokens += usage.get("input_tokens", 0)
+            output_tokens += usage.get("output_tokens", 0)
+            cache_creation += usage.get("cache_creation_input_tokens", 0)
+            cache_read += usage.get("cache_read_input_tokens", 0)
 
         # Add last window
-        if current_window:
-            windows.append(current_window)
+        if window_end is not None:
+            close_window()
 
         return windows
 
@@ -278,20 +1018,12 @@ class ClaudeDataExtractor:
         if not messages:
             return None
 
-        # Sort messages by timestamp
-        sorted_messages = sorted(
-            messages,
-            key=lambda m: datetime.fromisoformat(m["timestamp"].replace("Z", "+00:00")),
-        )
-
         # Find sessions by detecting gaps
         sessions = []
         current_session = {"messages": [], "total_tokens": 0, "cost": 0}
         prev_time = None
 
-        for msg in sorted_messages:
-            msg_time = datetime.fromisoformat(msg["timestamp"].replace("Z", "+00:00"))
-
+        for msg_time, msg in sort_by_timestamp(messages):
             # Check for inactivity gap
             if prev_time and (msg_time - prev_time).total_seconds() > (
                 inactivity_threshold_minutes * 60
@@ -335,17 +1067,6 @@ class ClaudeDataExtractor:
                 for session in project_data["sessions"]:
                     all_messages.extend(session["messages"])
 
-        if not all_messages:
-            return {
-                "current_window_tokens": 0,
-                "current_window_start": None,
-                "next_reset_at": None,
-                "time_until_reset_seconds": None,
-                "time_until_reset_human": None,
-                "is_within_active_window": False,
-            }
-
-        # Calculate windows
         windows = self.calculate_rate_limit_windows(all_messages, window_hours)
 
         if not windows:
@@ -2,11 +2,103 @@ from celery import shared_task
 from django.utils import timezone
 from datetime import timedelta
 import logging
+from django.db import transaction
 from .models import UsageSnapshot, Session, Project
+from .services import ClaudeDataExtractor, import_usage_data
 
 logger = logging.getLogger(__name__)
 
 
+@shared_task(bind=True)
+def ingest_project(self, project_name, claude_path="~/.claude"):
+    """
+    Parse one Claude project directory and write its sessions and snapshots.
+
+    Each project is imported in its own transaction so a failure in one
+    project does not roll back the others.
+    """
+    try:
+        extractor = ClaudeDataExtractor(claude_path)
+        project_data = extractor.get_project_data(project_name)
+
+        if not project_data or not project_data["sessions"]:
+            logger.info(f"Task {self.request.id}: No data for project {project_name}")
+            return {
+                "projects_created": 0,
+                "sessions_created": 0,
+                "snapshots_created": 0,
+            }
+
+        with transaction.atomic():
+            counts = import_usage_data([project_data], claude_path=claude_path)
+
+        logger.info(
+            f"Task {self.request.id}: Imported project {project_name}: "
+            f"{counts['sessions_created']} new sessions, "
+            f"{counts['snapshots_created']} snapshots"
+        )
+        return counts
+
+    except Exception as e:
+        logger.error(f"Task {self.request.id} failed: {str(e)}")
+        raise
+
+
+@shared_task(bind=True)
+def refresh_claude_data(self, claude_path="~/.claude"):
+    """
+    Re-read every Claude project and write the results in one transaction.
+
+    Backs the refresh endpoint, which queues this task instead of parsing
+    the JSONL files on the request thread.
+    """
+    try:
+        extractor = ClaudeDataExtractor(claude_path)
+        # An explicit refresh should pick up projects created moments ago
+        extractor.clear_projects_cache()
+        data = extractor.extract_usage_data()
+
+        with transaction.atomic():
+            counts = import_usage_data(data, claude_path=claude_path, batch_size=1000)
+
+        logger.info(
+            f"Task {self.request.id}: Refreshed {len(data)} projects, "
+            f"{counts['snapshots_created']} new snapshots"
+        )
+        return {
+            **counts,
+            "projects_updated": len(data),
+            "total_sessions": sum(len(p["sessions"]) for p in data),
+        }
+
+    except Exception as e:
+        logger.error(f"Task {self.request.id} failed: {str(e)}")
+        raise
+
+
+@shared_task(bind=True)
+def sync_agent_usage(self, usage_data):
+    """
+    Import a reshaped agent sync payload too large to handle in the request.
+
+    usage_data is the extractor-shaped list agent_sync_claude_usage builds
+    from the posted projects.
+    """
+    try:
+        with transaction.atomic():
+            counts = import_usage_data(usage_data, batch_size=1000)
+
+        logger.info(
+            f"Task {self.request.id}: Synced {len(usage_data)} agent projects, "
+            f"{counts['snapshots_created']} new snapshots"
+        )
+        return counts
+
+    except Exception as e:
+        logger.error(f"Task {self.request.id} failed: {str(e)}")
+        raise
+
+
 @shared_task(bind=True, ignore_result=True)
 def cleanup_old_snapshots(self, hours=6):
     """
@@ -18,24 +110,24 @@ def cleanup_old_snapshots(self, hours=6):
     try:
         cutoff_time = timezone.now() - timedelta(hours=hours)
 
-        # Count before deletion
-        old_snapshots = UsageSnapshot.objects.filter(timestamp__lt=cutoff_time)
-        count = old_snapshots.count()
-
-        if count > 0:
-            # Delete old snapshots
-            deleted, _ = old_snapshots.delete()
+        with transaction.atomic():
+            # delete() reports the row counts, so no separate count() queries
+            deleted, _ = UsageSnapshot.objects.filter(
+                timestamp__lt=cutoff_time
+            ).delete()
 
-            # Clean up sessions with no snapshots
-            empty_sessions = Session.objects.filter(usage_snapshots__isnull=True)
-            sessions_deleted = empty_sessions.count()
-            empty_sessions.delete()
+            if deleted > 0:
+                # Clean up sessions with no snapshots
+                sessions_deleted, _ = Session.objects.filter(
+                    usage_snapshots__isnull=True
+                ).delete()
 
-            # Clean up projects with no sessions
-            empty_projects = Project.objects.filter(sessions__isnull=True)
-            projects_deleted = empty_projects.count()
-            empty_projects.delete()
+                # Clean up projects with no sessions
+                projects_deleted, _ = Project.objects.filter(
+                    sessions__isnull=True
+                ).delete()
 
+        if deleted > 0:
             logger.info(
                 f"Task {self.request.id}: Cleaned up {deleted} snapshots, "
                 f"{sessions_deleted} sessions, {projects_deleted} projects "
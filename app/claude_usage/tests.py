@@ -0,0 +1,1208 @@
+import json
+import fcntl
+import os
+import shelve
+import tempfile
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from restAPI.utils.throttling import DashboardRateThrottle
+
+from . import services, views
+from .models import Project, Session, UsageSnapshot
+from .services import ClaudeDataExtractor, latest_snapshot_window
+from .tasks import cleanup_old_snapshots, ingest_project, refresh_claude_data
+
+User = get_user_model()
+
+
+def make_message(session_id, timestamp, input_tokens=10, output_tokens=20):
+    """Build an assistant log entry in the shape Claude writes to JSONL."""
+    return {
+        "parentUuid": None,
+        "sessionId": session_id,
+        "message": {
+            "id": f"msg_{timestamp}",
+            "model": "claude-sonnet-4-20250514",
+            "role": "assistant",
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        },
+        "requestId": f"req_{timestamp}",
+        "type": "assistant",
+        "timestamp": timestamp,
+    }
+
+
+class ClaudeDataTestMixin:
+    """Creates a temporary ~/.claude tree with one project."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.project_dir = os.path.join(self.tmpdir.name, "projects", "demo")
+        os.makedirs(self.project_dir)
+        self.extractor = ClaudeDataExtractor(self.tmpdir.name)
+
+    def write_session(self, name, entries, raw_lines=()):
+        path = os.path.join(self.project_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            for line in raw_lines:
+                f.write(line + "\n")
+        return path
+
+
+class ClaudeDataExtractorTestCase(ClaudeDataTestMixin, TestCase):
+    """Test cases for parsing Claude JSONL session files."""
+
+    def test_parse_session_file_keeps_only_assistant_messages(self):
+        """Test that user lines and malformed lines are skipped."""
+        user_entry = {
+            "sessionId": "s1",
+            "type": "user",
+            "message": {"role": "user", "content": "hi"},
+            "timestamp": "2025-09-14T11:00:00.000Z",
+        }
+        path = self.write_session(
+            "s1.jsonl",
+            [user_entry, make_message("s1", "2025-09-14T11:00:01.000Z")],
+            raw_lines=['{"type":"assistant", broken', ""],
+        )
+
+        messages = self.extractor.parse_session_file(path)
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]["sessionId"], "s1")
+        self.assertEqual(messages[0]["message"]["usage"]["input_tokens"], 10)
+
+    def test_parse_session_file_keeps_only_usage_fields(self):
+        """Test that content and unrelated metadata are dropped from messages."""
+        entry = make_message("s1", "2025-09-14T11:00:00.000Z")
+        entry["message"]["content"] = [{"type": "text", "text": "x" * 1000}]
+        entry["message"]["usage"]["service_tier"] = "standard"
+        no_usage = make_message("s1", "2025-09-14T11:00:01.000Z")
+        del no_usage["message"]["usage"]
+        path = self.write_session("s1.jsonl", [entry, no_usage])
+
+        messages = self.extractor.parse_session_file(path)
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(
+            messages[0],
+            {
+                "type": "assistant",
+                "sessionId": "s1",
+                "timestamp": "2025-09-14T11:00:00.000Z",
+                "requestId": "req_2025-09-14T11:00:00.000Z",
+                "message": {
+                    "id": "msg_2025-09-14T11:00:00.000Z",
+                    "model": "claude-sonnet-4-20250514",
+                    "usage": {
+                        "input_tokens": 10,
+                        "output_tokens": 20,
+                        "cache_creation_input_tokens": 0,
+                        "cache_read_input_tokens": 0,
+                    },
+                },
+            },
+        )
+
+    def test_read_messages_through_mmap(self):
+        """Test that the mmap scan matches the line reader, tail included."""
+        user_entry = {"sessionId": "s1", "type": "user", "timestamp": "x"}
+        path = self.write_session(
+            "s1.jsonl",
+            [make_message("s1", "2025-09-14T11:00:00.000Z"), user_entry],
+            raw_lines=['{"type":"assistant", broken'],
+        )
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(make_message("s1", "2025-09-14T11:05:00.000Z")))
+
+        expected = self.extractor._read_messages(path)
+        with mock.patch.object(services, "MMAP_THRESHOLD", 0):
+            mapped = self.extractor._read_messages(path)
+            self.assertEqual(mapped, expected)
+            self.assertEqual(len(mapped[0]), 1)
+            self.assertEqual(len(mapped[1]), 1)
+            self.assertEqual(
+                self.extractor._read_messages(path, offset=mapped[2]),
+                ([], mapped[1], mapped[2]),
+            )
+
+    def test_get_project_data_totals(self):
+        """Test that session totals are summed across messages."""
+        self.write_session(
+            "s1.jsonl",
+            [
+                make_message("s1", "2025-09-14T11:00:00.000Z", 1, 2),
+                make_message("s1", "2025-09-14T11:05:00.000Z", 3, 4),
+            ],
+        )
+
+        data = self.extractor.get_project_data("demo")
+
+        self.assertEqual(len(data["sessions"]), 1)
+        session = data["sessions"][0]
+        self.assertEqual(session["session_id"], "s1")
+        self.assertEqual(session["message_count"], 2)
+        self.assertEqual(session["total_input_tokens"], 4)
+        self.assertEqual(session["total_output_tokens"], 6)
+        self.assertEqual(session["total_tokens"], 10)
+
+    def test_get_usage_stats_totals(self):
+        """Test that overall stats add up every session."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+        self.write_session(
+            "s2.jsonl",
+            [
+                make_message("s2", "2025-09-14T12:00:00.000Z", 1, 2),
+                make_message("s2", "2025-09-14T12:05:00.000Z", 3, 4),
+            ],
+        )
+
+        stats = self.extractor.get_usage_stats()
+
+        self.assertEqual(stats["total_sessions"], 2)
+        self.assertEqual(stats["total_messages"], 3)
+        self.assertEqual(stats["total_input_tokens"], 14)
+        self.assertEqual(stats["total_output_tokens"], 26)
+        self.assertEqual(stats["total_tokens"], 40)
+        self.assertEqual(stats["projects"], 1)
+
+    def test_cache_file_reuses_and_extends_parsed_sessions(self):
+        """Test that cached sessions are reused and appended lines are picked up."""
+        cache_file = os.path.join(self.tmpdir.name, "parse-cache")
+        persistent_cache = shelve.open(cache_file)
+        self.addCleanup(persistent_cache.close)
+        extractor = ClaudeDataExtractor(
+            self.tmpdir.name, persistent_cache=persistent_cache
+        )
+        first = make_message("s1", "2025-09-14T11:00:00.000Z")
+        path = self.write_session("s1.jsonl", [first])
+
+        self.assertEqual(len(extractor.parse_session_file(path)), 1)
+        self.assertEqual(len(extractor.parse_session_file(path)), 1)
+
+        with open(path, "a", encoding="utf-8") as f:
+            second = make_message("s1", "2025-09-14T11:05:00.000Z")
+            f.write(json.dumps(second, separators=(",", ":")) + "\n")
+            # A line still being written has no trailing newline yet
+            f.write(json.dumps(make_message("s1", "2025-09-14T11:06:00.000Z")))
+
+        messages = extractor.parse_session_file(path)
+        self.assertEqual(
+            [m["timestamp"] for m in messages],
+            [
+                "2025-09-14T11:00:00.000Z",
+                "2025-09-14T11:05:00.000Z",
+                "2025-09-14T11:06:00.000Z",
+            ],
+        )
+
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n")
+        self.assertEqual(len(extractor.parse_session_file(path)), 3)
+
+    def test_get_project_data_parses_many_sessions(self):
+        """Test that every session file is returned, in listing order."""
+        for n in range(5):
+            self.write_session(
+                f"s{n}.jsonl", [make_message(f"s{n}", "2025-09-14T11:00:00.000Z")]
+            )
+        self.write_session("empty.jsonl", [])
+
+        data = self.extractor.get_project_data("demo")
+
+        expected = [
+            os.path.basename(path)[:-6]
+            for path in self.extractor.get_project_sessions("demo")
+            if not path.endswith("empty.jsonl")
+        ]
+        self.assertEqual([s["session_id"] for s in data["sessions"]], expected)
+
+    def test_get_project_sessions_lists_only_jsonl_files(self):
+        """Test that hidden files and directories named *.jsonl are skipped."""
+        path = self.write_session("s1.jsonl", [])
+        self.write_session(".hidden.jsonl", [])
+        self.write_session("notes.txt", [])
+        os.makedirs(os.path.join(self.project_dir, "nested.jsonl"))
+
+        self.assertEqual(self.extractor.get_project_sessions("demo"), [path])
+
+    def test_unchanged_files_are_not_parsed_again(self):
+        """Test that the in-process cache serves unchanged files."""
+        path = self.write_session(
+            "s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")]
+        )
+        self.extractor.parse_session_file(path)
+
+        with mock.patch.object(
+            ClaudeDataExtractor, "_read_messages", side_effect=AssertionError
+        ):
+            messages = ClaudeDataExtractor(self.tmpdir.name).parse_session_file(path)
+
+        self.assertEqual(len(messages), 1)
+
+    def test_session_cache_keeps_only_recent_files(self):
+        """Test that the in-process cache evicts the least recently used file."""
+        paths = [
+            self.write_session(
+                f"s{n}.jsonl", [make_message(f"s{n}", "2025-09-14T11:00:00.000Z")]
+            )
+            for n in range(3)
+        ]
+
+        with mock.patch.object(services, "SESSION_CACHE_MAX_ENTRIES", 2):
+            self.extractor.parse_session_file(paths[0])
+            self.extractor.parse_session_file(paths[1])
+            # Touching the first file makes the second the oldest entry
+            self.extractor.parse_session_file(paths[0])
+            self.extractor.parse_session_file(paths[2])
+
+        self.assertIn(paths[0], services._SESSION_CACHE)
+        self.assertNotIn(paths[1], services._SESSION_CACHE)
+        self.assertIn(paths[2], services._SESSION_CACHE)
+        self.assertLessEqual(len(services._SESSION_CACHE), 2)
+
+    def test_calculate_rate_limit_windows_sorts_and_skips_invalid(self):
+        """Test that windows follow timestamp order and bad timestamps are dropped."""
+        messages = [
+            make_message("s1", "2025-09-14T16:20:00.000Z"),
+            make_message("s1", "not-a-timestamp"),
+            make_message("s1", "2025-09-14T11:30:00+00:00"),
+            make_message("s1", "2025-09-14T12:45:00.000Z"),
+        ]
+
+        windows = self.extractor.calculate_rate_limit_windows(messages)
+
+        self.assertEqual(
+            [(w["start_time"].hour, w["end_time"].hour) for w in windows],
+            [(11, 16), (16, 21)],
+        )
+        self.assertEqual([len(w["messages"]) for w in windows], [2, 1])
+
+    def test_rate_limit_status_counts_out_of_order_messages(self):
+        """Test that earlier and same-time messages written later are counted."""
+        start = (timezone.now() - timedelta(hours=2)).replace(
+            minute=0, second=0, microsecond=0
+        )
+
+        def stamp(minutes):
+            return (start + timedelta(minutes=minutes)).isoformat()
+
+        self.write_session("s1.jsonl", [make_message("s1", stamp(30))])
+        first = self.extractor.get_current_rate_limit_status()
+        self.assertEqual(first["current_window_tokens"], 30)
+
+        # A parallel session logs a message at the same time and one earlier
+        self.write_session(
+            "s2.jsonl",
+            [make_message("s2", stamp(5), 5, 5), make_message("s2", stamp(30))],
+        )
+        current = self.extractor.get_current_rate_limit_status()
+
+        self.assertEqual(current["current_window_tokens"], 70)
+        self.assertEqual(current["current_window_start"], start.isoformat())
+
+    def test_get_all_projects_caches_listing(self):
+        """Test that the project listing is reused until cleared."""
+        self.assertEqual(self.extractor.get_all_projects(), ["demo"])
+        os.makedirs(os.path.join(self.tmpdir.name, "projects", "other"))
+
+        self.assertEqual(self.extractor.get_all_projects(), ["demo"])
+
+        self.extractor.clear_projects_cache()
+        self.assertEqual(sorted(self.extractor.get_all_projects()), ["demo", "other"])
+
+    def test_unknown_project_returns_none(self):
+        """Test that a missing project directory yields None."""
+        self.assertIsNone(self.extractor.get_project_data("missing"))
+
+
+class UpdateClaudeDataCommandTestCase(ClaudeDataTestMixin, TestCase):
+    """Test cases for the update_claude_data management command."""
+
+    def run_command(self, **options):
+        call_command(
+            "update_claude_data",
+            claude_path=self.tmpdir.name,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def test_command_imports_sessions_and_snapshots(self):
+        """Test that projects, sessions and snapshots are created."""
+        self.write_session(
+            "s1.jsonl",
+            [
+                make_message("s1", "2025-09-14T11:00:00.000Z", 1, 2),
+                make_message("s1", "2025-09-14T11:05:00.000Z", 3, 4),
+            ],
+        )
+
+        self.run_command()
+
+        self.assertEqual(Project.objects.get().name, "demo")
+        session = Session.objects.get()
+        self.assertEqual(session.session_id, "s1")
+        self.assertEqual(session.total_tokens, 10)
+        self.assertEqual(session.created_at.isoformat(), "2025-09-14T11:00:00+00:00")
+        self.assertEqual(UsageSnapshot.objects.count(), 2)
+
+    def test_command_is_idempotent(self):
+        """Test that re-running the command does not duplicate snapshots."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+
+        self.run_command()
+        self.run_command()
+
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(UsageSnapshot.objects.count(), 1)
+
+    def test_command_only_rewrites_changed_snapshots(self):
+        """Test that unchanged snapshots keep their rows across re-runs."""
+        kept = make_message("s1", "2025-09-14T11:00:00.000Z")
+        duplicate = make_message("s1", "2025-09-14T11:00:00.000Z")
+        self.write_session(
+            "s1.jsonl",
+            [kept, duplicate, make_message("s1", "2025-09-14T11:05:00.000Z", 100, 1)],
+        )
+        self.run_command()
+        kept_ids = set(
+            UsageSnapshot.objects.filter(input_tokens=10).values_list("id", flat=True)
+        )
+
+        # Rewritten with a shorter line, so the parse cache re-reads the file
+        self.write_session(
+            "s1.jsonl",
+            [kept, duplicate, make_message("s1", "2025-09-14T11:05:00.000Z", 2, 1)],
+        )
+        self.run_command()
+
+        self.assertEqual(UsageSnapshot.objects.count(), 3)
+        self.assertEqual(
+            set(
+                UsageSnapshot.objects.filter(input_tokens=10).values_list(
+                    "id", flat=True
+                )
+            ),
+            kept_ids,
+        )
+        self.assertEqual(
+            UsageSnapshot.objects.get(
+                message_id__endswith="11:05:00.000Z"
+            ).input_tokens,
+            2,
+        )
+
+    def test_command_keeps_unchanged_snapshots_on_resync(self):
+        """Test that syncing the same file twice leaves every row in place."""
+        # 14 cache read tokens cost 0.0000525 USD, exactly half a stored unit
+        boundary = make_message("s1", "2025-09-14T11:05:00.000Z", 0, 0)
+        boundary["message"]["usage"]["cache_read_input_tokens"] = 14
+        self.write_session(
+            "s1.jsonl",
+            [make_message("s1", "2025-09-14T11:00:00.000Z", 7, 3), boundary],
+        )
+        self.run_command()
+        ids = set(UsageSnapshot.objects.values_list("id", flat=True))
+
+        with mock.patch.object(
+            services, "insert_snapshots", wraps=services.insert_snapshots
+        ) as insert:
+            self.run_command()
+
+        self.assertEqual(set(UsageSnapshot.objects.values_list("id", flat=True)), ids)
+        self.assertEqual(insert.call_args.args[0], [])
+        self.assertEqual(
+            str(UsageSnapshot.objects.get(cache_read_tokens=14).cost_usd), "0.000053"
+        )
+
+    def test_command_reuses_cache_file(self):
+        """Test that a cache file written by one run serves the next."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+        cache_file = os.path.join(self.tmpdir.name, "parse-cache")
+        self.run_command(cache_file=cache_file)
+        services._SESSION_CACHE.clear()
+
+        with mock.patch.object(
+            ClaudeDataExtractor, "_read_messages", side_effect=AssertionError
+        ):
+            self.run_command(cache_file=cache_file)
+
+        self.assertEqual(UsageSnapshot.objects.count(), 1)
+
+    def test_command_refuses_cache_file_in_use(self):
+        """Test that two runs cannot write the same cache file at once."""
+        cache_file = os.path.join(self.tmpdir.name, "parse-cache")
+        with open(f"{cache_file}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self.assertRaises(CommandError):
+                self.run_command(cache_file=cache_file)
+
+    def test_command_skips_invalid_timestamps(self):
+        """Test that messages with unparseable timestamps are skipped."""
+        self.write_session(
+            "s1.jsonl",
+            [
+                make_message("s1", "2025-09-14T11:00:00.000Z"),
+                make_message("s1", "not-a-date"),
+            ],
+        )
+
+        self.run_command()
+
+        self.assertEqual(UsageSnapshot.objects.count(), 1)
+
+    def test_command_updates_existing_session_totals(self):
+        """Test that a re-run refreshes totals of an existing session."""
+        first = make_message("s1", "2025-09-14T11:00:00.000Z", 1, 2)
+        self.write_session("s1.jsonl", [first])
+        self.run_command()
+
+        self.write_session(
+            "s1.jsonl", [first, make_message("s1", "2025-09-14T11:05:00.000Z", 3, 4)]
+        )
+        self.run_command()
+
+        session = Session.objects.get()
+        self.assertEqual(session.message_count, 2)
+        self.assertEqual(session.total_tokens, 10)
+        self.assertEqual(UsageSnapshot.objects.count(), 2)
+
+    def test_command_stores_missing_ids_as_empty_strings(self):
+        """Test that absent request/message ids are stored as empty strings."""
+        message = make_message("s1", "2025-09-14T11:00:00.000Z")
+        del message["requestId"]
+        del message["message"]["id"]
+        self.write_session("s1.jsonl", [message])
+
+        self.run_command()
+
+        snapshot = UsageSnapshot.objects.get()
+        self.assertEqual(snapshot.request_id, "")
+        self.assertEqual(snapshot.message_id, "")
+        self.assertEqual(snapshot.total_tokens, 30)
+
+
+class IngestProjectTaskTestCase(ClaudeDataTestMixin, TestCase):
+    """Test cases for the per-project Celery ingest task."""
+
+    def test_ingest_project_imports_one_project(self):
+        """Test that the task imports only the requested project."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+        os.makedirs(os.path.join(self.tmpdir.name, "projects", "other"))
+
+        counts = ingest_project.apply(args=["demo", self.tmpdir.name]).get()
+
+        self.assertEqual(counts["projects_created"], 1)
+        self.assertEqual(counts["sessions_created"], 1)
+        self.assertEqual(counts["snapshots_created"], 1)
+        self.assertEqual(list(Project.objects.values_list("name", flat=True)), ["demo"])
+
+
+class ImportUsageDataTestCase(TestCase):
+    """Test cases for writing extracted data with import_usage_data."""
+
+    def test_projects_inserted_concurrently_are_not_counted(self):
+        """Test that a project another import inserted first is not reported."""
+        bulk_create = Project.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            Project.objects.create(name="demo", path="/elsewhere")
+            return bulk_create(objs, **kwargs)
+
+        data = [{"project_name": "demo", "path": None, "sessions": []}]
+        with mock.patch.object(Project.objects, "bulk_create", racing_bulk_create):
+            counts = services.import_usage_data(data)
+
+        self.assertEqual(counts["projects_created"], 0)
+        self.assertEqual(Project.objects.get().path, "/elsewhere")
+
+
+class InsertSnapshotsTestCase(TestCase):
+    """Test cases for writing snapshots with insert_snapshots."""
+
+    def setUp(self):
+        self.project = Project.objects.create(name="demo", path="~/.claude/demo")
+        self.session = Session.objects.create(
+            session_id="s1", project=self.project, created_at=timezone.now()
+        )
+
+    def make_snapshot(self, **kwargs):
+        values = {
+            "project": self.project,
+            "session": self.session,
+            "input_tokens": 7,
+            "output_tokens": 3,
+            "total_tokens": 10,
+            "cost_usd": Decimal("0.000053"),
+            "model": 'claude "sonnet", 4',
+            "timestamp": datetime(
+                2025, 9, 14, 13, 0, 0, 250000, tzinfo=dt_timezone(timedelta(hours=2))
+            ),
+            "request_id": "",
+            "message_id": "msg_1",
+        }
+        values.update(kwargs)
+        return UsageSnapshot(**values)
+
+    def test_copy_buffer_serialises_rows(self):
+        """Test the CSV written for COPY: quoting, Decimals, datetimes and None."""
+        snapshot = self.make_snapshot(message_id=None)
+
+        row = services.snapshot_copy_buffer([snapshot]).getvalue()
+
+        self.assertEqual(
+            row,
+            f"{self.project.pk},{self.session.pk},7,3,0,0,10,0.000053,"
+            '"claude ""sonnet"", 4","2025-09-14 13:00:00.250000+02:00","",\n',
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "COPY requires PostgreSQL")
+    def test_copy_round_trip(self):
+        """Test that rows written with COPY read back unchanged."""
+        snapshot = self.make_snapshot()
+
+        self.assertEqual(services.insert_snapshots([snapshot]), 1)
+
+        stored = UsageSnapshot.objects.get()
+        self.assertEqual(stored.cost_usd, Decimal("0.000053"))
+        self.assertEqual(stored.model, 'claude "sonnet", 4')
+        self.assertEqual(stored.timestamp, snapshot.timestamp)
+        self.assertEqual(stored.request_id, "")
+        self.assertEqual(stored.message_id, "msg_1")
+
+    @skipUnless(connection.vendor == "postgresql", "COPY requires PostgreSQL")
+    def test_copy_writes_none_as_null(self):
+        """Test that None reaches the database as NULL, as with bulk_create."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            services.insert_snapshots([self.make_snapshot(message_id=None)])
+
+
+class LatestSnapshotWindowTestCase(TestCase):
+    """Test cases for building the latest rate limit window from the database."""
+
+    def test_matches_full_window_calculation(self):
+        """Test that skipping rows before the last long gap gives the same window."""
+        project = Project.objects.create(name="demo", path="~/.claude/demo")
+        session = Session.objects.create(
+            session_id="s1", project=project, created_at=timezone.now()
+        )
+        base = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(
+            hours=12
+        )
+        offsets = [(-6, 0), (0, 10), (4, 50), (5, 30), (6, 0)]
+        for index, (hours, minutes) in enumerate(offsets):
+            UsageSnapshot.objects.create(
+                project=project,
+                session=session,
+                input_tokens=index + 1,
+                cost_usd="0",
+                model="claude-sonnet-4-20250514",
+                timestamp=base + timedelta(hours=hours, minutes=minutes),
+            )
+        messages = [
+            make_message("s1", snapshot.timestamp.isoformat(), snapshot.input_tokens, 0)
+            for snapshot in UsageSnapshot.objects.all()
+        ]
+        expected = ClaudeDataExtractor("/nonexistent").calculate_rate_limit_windows(
+            messages
+        )[-1]
+
+        window = latest_snapshot_window(UsageSnapshot.objects.all())
+
+        self.assertEqual(window["start_time"], base + timedelta(hours=5))
+        self.assertEqual(window["start_time"], expected["start_time"])
+        self.assertEqual(window["total_tokens"], expected["total_tokens"])
+        self.assertEqual(window["input_tokens"], 9)
+
+    def test_no_snapshots(self):
+        """Test that an empty table has no window."""
+        self.assertIsNone(latest_snapshot_window(UsageSnapshot.objects.all()))
+
+
+class RefreshClaudeDataTaskTestCase(ClaudeDataTestMixin, TestCase):
+    """Test cases for the Celery task behind the refresh endpoint."""
+
+    def test_refresh_imports_and_updates_sessions(self):
+        """Test that a refresh imports snapshots and refreshes session totals."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+        result = refresh_claude_data.apply(args=[self.tmpdir.name]).get()
+        self.assertEqual(result["total_sessions"], 1)
+        self.assertEqual(result["snapshots_created"], 1)
+
+        self.write_session(
+            "s1.jsonl",
+            [
+                make_message("s1", "2025-09-14T11:00:00.000Z"),
+                make_message("s1", "2025-09-14T11:05:00.000Z"),
+            ],
+        )
+        refresh_claude_data.apply(args=[self.tmpdir.name]).get()
+
+        self.assertEqual(UsageSnapshot.objects.count(), 2)
+        self.assertEqual(Session.objects.get(session_id="s1").message_count, 2)
+
+
+class RefreshDataAPITestCase(TestCase):
+    """Test cases for the refresh endpoints."""
+
+    def setUp(self):
+        views.cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@example.com", username="testuser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def queue_refresh(self, task_id="task-1"):
+        with mock.patch.object(views.refresh_claude_data, "delay") as delay:
+            delay.return_value.id = task_id
+            return self.client.post(reverse("claude_usage:refresh-data"))
+
+    def test_refresh_data_queues_task(self):
+        """Test that a refresh request returns the queued task id."""
+        with mock.patch.object(views.refresh_claude_data, "delay") as delay:
+            delay.return_value.id = "task-1"
+            response = self.client.post(reverse("claude_usage:refresh-data"))
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["task_id"], "task-1")
+        delay.assert_called_once_with()
+
+    def test_refresh_status_reports_result(self):
+        """Test that a finished refresh returns its counts."""
+        self.queue_refresh()
+        with mock.patch.object(views, "AsyncResult") as async_result:
+            async_result.return_value.state = "SUCCESS"
+            async_result.return_value.successful.return_value = True
+            async_result.return_value.result = {"total_sessions": 1}
+            response = self.client.get(
+                reverse("claude_usage:refresh-status", args=["task-1"])
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["state"], "SUCCESS")
+        self.assertEqual(response.data["result"], {"total_sessions": 1})
+        async_result.assert_called_once_with("task-1")
+
+    def test_refresh_status_hides_failure_details(self):
+        """Test that a failed refresh does not expose the exception text."""
+        self.queue_refresh()
+        with mock.patch.object(views, "AsyncResult") as async_result:
+            async_result.return_value.state = "FAILURE"
+            async_result.return_value.successful.return_value = False
+            async_result.return_value.failed.return_value = True
+            async_result.return_value.result = RuntimeError("secret path")
+            response = self.client.get(
+                reverse("claude_usage:refresh-status", args=["task-1"])
+            )
+
+        self.assertEqual(response.data["error"], "Refresh failed")
+
+    def test_refresh_status_only_reports_own_tasks(self):
+        """Test that ids not queued by this user are reported as not found."""
+        self.queue_refresh()
+        other = User.objects.create_user(
+            email="other@example.com", username="other", password="testpass123"
+        )
+
+        with mock.patch.object(views, "AsyncResult") as async_result:
+            unknown = self.client.get(
+                reverse("claude_usage:refresh-status", args=["unrelated-task"])
+            )
+            self.client.force_authenticate(user=other)
+            foreign = self.client.get(
+                reverse("claude_usage:refresh-status", args=["task-1"])
+            )
+
+        self.assertEqual(unknown.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(foreign.status_code, status.HTTP_404_NOT_FOUND)
+        async_result.assert_not_called()
+
+
+class CleanupOldSnapshotsTaskTestCase(TestCase):
+    """Test cases for the snapshot retention task."""
+
+    def test_cleanup_removes_old_rows_and_empty_parents(self):
+        """Test that old snapshots go, along with sessions and projects left empty."""
+        now = timezone.now()
+        for name, hours_ago in (("old", 10), ("recent", 1)):
+            project = Project.objects.create(name=name, path=f"~/.claude/{name}")
+            session = Session.objects.create(
+                session_id=name, project=project, created_at=now
+            )
+            UsageSnapshot.objects.create(
+                project=project,
+                session=session,
+                cost_usd="0",
+                model="claude-sonnet-4-20250514",
+                timestamp=now - timedelta(hours=hours_ago),
+            )
+
+        result = cleanup_old_snapshots.apply(kwargs={"hours": 6}).get()
+
+        self.assertEqual(result["deleted_snapshots"], 1)
+        self.assertEqual(result["deleted_sessions"], 1)
+        self.assertEqual(result["deleted_projects"], 1)
+        self.assertEqual(
+            list(Project.objects.values_list("name", flat=True)), ["recent"]
+        )
+
+    def test_cleanup_without_old_rows(self):
+        """Test that nothing is removed when every snapshot is recent."""
+        result = cleanup_old_snapshots.apply().get()
+
+        self.assertEqual(result, {"message": "No old data to clean"})
+
+
+class AgentSyncAPITestCase(TestCase):
+    """Test cases for the agent sync webhook."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@example.com", username="testuser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("claude_usage:agent-sync")
+
+    def sync(self, messages):
+        payload = {
+            "projects": [
+                {
+                    "name": "demo",
+                    "path": "/home/agent/.claude/projects/demo",
+                    "sessions": [
+                        {"session_id": "s1", "messages": messages},
+                        {"session_id": "empty", "messages": []},
+                    ],
+                }
+            ]
+        }
+        return self.client.post(self.url, payload, format="json")
+
+    def test_agent_sync_creates_rows(self):
+        """Test that a sync stores the project, session and snapshots."""
+        response = self.sync(
+            [
+                make_message("s1", "2025-09-14T11:00:00.000Z", 1, 2),
+                make_message("s1", "2025-09-14T11:05:00.000Z", 3, 4),
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["projects_updated"], 1)
+        self.assertEqual(response.data["sessions_updated"], 1)
+        self.assertEqual(response.data["snapshots_created"], 2)
+        project = Project.objects.get(name="demo")
+        self.assertEqual(project.path, "/home/agent/.claude/projects/demo")
+        session = Session.objects.get(session_id="s1")
+        self.assertEqual(session.total_tokens, 10)
+        self.assertFalse(Session.objects.filter(session_id="empty").exists())
+
+    def test_agent_sync_updates_existing_session(self):
+        """Test that a repeated sync refreshes totals without duplicating rows."""
+        first = make_message("s1", "2025-09-14T11:00:00.000Z", 1, 2)
+        self.sync([first])
+        response = self.sync([first, make_message("s1", "2025-09-14T11:05:00.000Z")])
+
+        self.assertEqual(response.data["sessions_updated"], 0)
+        self.assertEqual(response.data["snapshots_created"], 1)
+        self.assertEqual(UsageSnapshot.objects.count(), 2)
+        self.assertEqual(Session.objects.get(session_id="s1").message_count, 2)
+
+    def test_agent_sync_queues_large_payloads(self):
+        """Test that payloads over the threshold are imported by a task."""
+        with mock.patch.object(views, "AGENT_SYNC_ASYNC_THRESHOLD", 1):
+            response = self.sync(
+                [
+                    make_message("s1", "2025-09-14T11:00:00.000Z", 1, 2),
+                    make_message("s1", "2025-09-14T11:05:00.000Z", 3, 4),
+                ]
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "queued")
+        self.assertIn("task_id", response.data)
+        # Tasks run eagerly under test settings
+        self.assertEqual(Session.objects.get(session_id="s1").total_tokens, 10)
+        self.assertEqual(UsageSnapshot.objects.count(), 2)
+        # The queued sync can be polled on the refresh status endpoint
+        with mock.patch.object(views, "AsyncResult") as async_result:
+            async_result.return_value.state = "SUCCESS"
+            async_result.return_value.successful.return_value = True
+            async_result.return_value.result = {"snapshots_created": 2}
+            status_response = self.client.get(
+                reverse("claude_usage:refresh-status", args=[response.data["task_id"]])
+            )
+        self.assertEqual(status_response.status_code, status.HTTP_200_OK)
+
+    def test_agent_sync_rejects_malformed_json(self):
+        """Test that an unparseable body is a client error."""
+        response = self.client.post(
+            self.url, b'{"projects": [', content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_agent_sync_requires_projects(self):
+        """Test that an empty payload is rejected."""
+        response = self.client.post(self.url, {}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UpdateClaudeDataFullReloadTestCase(ClaudeDataTestMixin, TransactionTestCase):
+    """Test cases for --full-reload, which commits index changes with the import."""
+
+    def assert_snapshot_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, UsageSnapshot._meta.db_table
+            )
+        for index in UsageSnapshot._meta.indexes:
+            self.assertIn(index.name, constraints)
+
+    def test_full_reload_restores_snapshot_indexes(self):
+        """Test that --full-reload rebuilds the indexes it drops."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+
+        call_command(
+            "update_claude_data",
+            claude_path=self.tmpdir.name,
+            full_reload=True,
+            stdout=StringIO(),
+        )
+
+        self.assert_snapshot_indexes_exist()
+        self.assertEqual(UsageSnapshot.objects.count(), 1)
+
+    def test_failed_full_reload_keeps_snapshot_indexes(self):
+        """Test that a failed import rolls back the dropped indexes."""
+        self.write_session("s1.jsonl", [make_message("s1", "2025-09-14T11:00:00.000Z")])
+
+        with mock.patch(
+            "app.claude_usage.management.commands.update_claude_data"
+            ".import_usage_data",
+            side_effect=RuntimeError("import failed"),
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "update_claude_data",
+                    claude_path=self.tmpdir.name,
+                    full_reload=True,
+                    stdout=StringIO(),
+                )
+
+        self.assert_snapshot_indexes_exist()
+
+
+class ClaudeUsageAPITestCase(TestCase):
+    """Test cases for the Claude usage read endpoints."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        views.cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="test@example.com", username="testuser", password="testpass123"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        now = timezone.now()
+        self.project = Project.objects.create(name="demo", path="~/.claude/demo")
+        self.session = Session.objects.create(
+            session_id="s1",
+            project=self.project,
+            message_count=2,
+            total_tokens=300,
+            created_at=now - timedelta(minutes=20),
+        )
+        for minutes_ago, model in ((20, "claude-sonnet-4-20250514"), (10, "other")):
+            UsageSnapshot.objects.create(
+                project=self.project,
+                session=self.session,
+                input_tokens=100,
+                output_tokens=50,
+                total_tokens=150,
+                cost_usd="0.010000",
+                model=model,
+                timestamp=now - timedelta(minutes=minutes_ago),
+                message_id=f"msg_{minutes_ago}",
+            )
+
+    def test_usage_stats(self):
+        """Test overall totals and the active rate-limit window."""
+        response = self.client.get(reverse("claude_usage:usage-stats"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_tokens"], 300)
+        self.assertEqual(response.data["total_input_tokens"], 200)
+        self.assertEqual(response.data["total_messages"], 2)
+        self.assertEqual(response.data["total_sessions"], 1)
+        self.assertEqual(response.data["projects"], 1)
+        self.assertTrue(response.data["is_within_active_window"])
+        self.assertEqual(response.data["current_window_tokens"], 300)
+
+    def test_usage_stats_cached_until_snapshots_change(self):
+        """Test that repeat requests reuse the totals until a snapshot is added."""
+        url = reverse("claude_usage:usage-stats")
+        self.client.get(url)
+
+        # Only the snapshot signature and the project/session counts run on
+        # a cache hit
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data["total_tokens"], 300)
+
+        UsageSnapshot.objects.create(
+            project=self.project,
+            session=self.session,
+            input_tokens=1,
+            total_tokens=1,
+            cost_usd="0",
+            model="other",
+            timestamp=timezone.now(),
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data["total_tokens"], 301)
+        self.assertEqual(response.data["current_window_tokens"], 301)
+
+    def test_usage_stats_cache_sees_new_sessions(self):
+        """Test that sessions synced without new snapshots update the counts."""
+        url = reverse("claude_usage:usage-stats")
+        self.assertEqual(self.client.get(url).data["total_sessions"], 1)
+
+        other = Project.objects.create(name="other", path="~/.claude/other")
+        Session.objects.create(
+            session_id="s2", project=other, created_at=timezone.now()
+        )
+        response = self.client.get(url)
+
+        self.assertEqual(response.data["total_sessions"], 2)
+        self.assertEqual(response.data["projects"], 2)
+
+    def test_usage_timeseries_five_minute_intervals(self):
+        """Test that 5-minute points come from one grouped query."""
+        url = reverse("claude_usage:usage-timeseries")
+
+        # The cache signature check, then the grouped query
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"hours": 1, "interval": "5min"})
+
+        points = response.data["data_points"]
+        self.assertEqual(len(points), 13)
+        self.assertEqual(sum(point["total_tokens"] for point in points), 300)
+        self.assertEqual(
+            [point["message_count"] for point in points if point["message_count"]],
+            [1, 1],
+        )
+
+    def test_usage_timeseries_intervals_start_at_start_time(self):
+        """Test that 5-minute intervals are measured from the exact start_time."""
+        now = timezone.now().replace(microsecond=500000) + timedelta(days=30)
+        start_time = now - timedelta(hours=1)
+        boundary = start_time + timedelta(minutes=5)
+        for offset_us in (-100000, 100000):
+            UsageSnapshot.objects.create(
+                project=self.project,
+                session=self.session,
+                total_tokens=10,
+                cost_usd="0.001000",
+                timestamp=boundary + timedelta(microseconds=offset_us),
+                message_id=f"msg_boundary_{offset_us}",
+            )
+        url = reverse("claude_usage:usage-timeseries")
+
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            response = self.client.get(url, {"hours": 1, "interval": "5min"})
+
+        points = response.data["data_points"]
+        self.assertEqual(response.data["start_time"], start_time.isoformat())
+        self.assertEqual(points[0]["timestamp"], start_time.isoformat())
+        self.assertEqual(points[1]["timestamp"], boundary.isoformat())
+        self.assertEqual([point["message_count"] for point in points[:3]], [1, 1, 0])
+
+    def test_dashboard_summary(self):
+        """Test dashboard totals and model distribution for the active session."""
+        response = self.client.get(reverse("claude_usage:dashboard-summary"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["summary"]["total_tokens"], 300)
+        self.assertEqual(response.data["summary"]["total_messages"], 2)
+        self.assertEqual(
+            sorted(item["model"] for item in response.data["model_distribution"]),
+            ["claude-sonnet-4-20250514", "other"],
+        )
+        self.assertTrue(response.data["rate_limit"]["is_within_active_window"])
+
+    def test_rate_limit_window_shared_between_views(self):
+        """Test that usage_stats and the dashboard compute the window once."""
+        with mock.patch.object(
+            views, "latest_snapshot_window", wraps=latest_snapshot_window
+        ) as window_lookup:
+            stats = self.client.get(reverse("claude_usage:usage-stats"))
+            dashboard = self.client.get(reverse("claude_usage:dashboard-summary"))
+
+        window_lookup.assert_called_once()
+        self.assertEqual(
+            dashboard.data["rate_limit"]["current_window_tokens"],
+            stats.data["current_window_tokens"],
+        )
+
+    def test_dashboard_summary_cached_until_snapshots_change(self):
+        """Test that repeat dashboard requests reuse the response data."""
+        url = reverse("claude_usage:dashboard-summary")
+        self.client.get(url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data["summary"]["total_tokens"], 300)
+
+        UsageSnapshot.objects.create(
+            project=self.project,
+            session=self.session,
+            input_tokens=1,
+            total_tokens=1,
+            cost_usd="0",
+            model="other",
+            timestamp=timezone.now(),
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data["summary"]["total_tokens"], 301)
+
+    def test_dashboard_summary_reads_signature_once(self):
+        """Test that a cache miss runs the snapshot signature aggregate once."""
+        url = reverse("claude_usage:dashboard-summary")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sum('"latest_id"' in query["sql"] for query in queries.captured_queries),
+            1,
+        )
+
+    def test_read_endpoints_throttled(self):
+        """Test that dashboard reads are rate limited per user."""
+        url = reverse("claude_usage:project-list")
+
+        with mock.patch.object(
+            DashboardRateThrottle, "THROTTLE_RATES", {"dashboard": "1/min"}
+        ):
+            first = self.client.get(url)
+            second = self.client.get(url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_project_sessions(self):
+        """Test that sessions are returned with their snapshots."""
+        response = self.client.get(
+            reverse("claude_usage:project-sessions", args=["demo"])
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data[0]["usage_snapshots"]), 2)
+
+    def test_project_sessions_query_count(self):
+        """Test that snapshots are prefetched rather than queried per session."""
+        Session.objects.create(
+            session_id="s2", project=self.project, created_at=timezone.now()
+        )
+        url = reverse("claude_usage:project-sessions", args=["demo"])
+
+        # Project, sessions, and one prefetch for all their snapshots
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+
+        self.assertEqual(len(response.data), 2)
+
+    def test_project_list_query_count(self):
+        """Test that project totals are summed in the project query."""
+        other = Project.objects.create(name="other", path="~/.claude/other")
+        Session.objects.create(
+            session_id="s2",
+            project=other,
+            total_tokens=5,
+            total_cost="0.5",
+            created_at=timezone.now(),
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("claude_usage:project-list"))
+
+        totals = {
+            project["name"]: (
+                project["total_sessions"],
+                project["total_tokens"],
+                project["total_cost"],
+            )
+            for project in response.data["projects"]
+        }
+        self.assertEqual(totals, {"demo": (1, 300, 0), "other": (1, 5, 0.5)})
+        # Most recently updated first, as with the model ordering
+        self.assertEqual(response.data["projects"][0]["name"], "other")
+        self.assertEqual(response.data["count"], 2)
+
+    def test_session_detail(self):
+        """Test that a session is returned with its snapshots."""
+        response = self.client.get(reverse("claude_usage:session-detail", args=["s1"]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["session_id"], "s1")
+        self.assertEqual(len(response.data["usage_snapshots"]), 2)
+
+    def test_project_detail_does_not_cache_misses(self):
+        """Test that a project missing from disk is looked up again."""
+        url = reverse("claude_usage:project-detail", args=["missing"])
+
+        with mock.patch.object(
+            ClaudeDataExtractor, "get_project_data", return_value=None
+        ) as get_project_data:
+            first = self.client.get(url)
+            second = self.client.get(url)
+
+        self.assertEqual(first.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(second.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(get_project_data.call_count, 2)
+
+    def test_project_detail_query_count(self):
+        """Test that project detail prefetches sessions and snapshots."""
+        Session.objects.create(
+            session_id="s2", project=self.project, created_at=timezone.now()
+        )
+        url = reverse("claude_usage:project-detail", args=["demo"])
+
+        # Project, its sessions, and all of their snapshots
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+
+        self.assertEqual(response.data["total_sessions"], 2)
+        self.assertEqual(response.data["total_tokens"], 300)
+        self.assertEqual(len(response.data["sessions"]), 2)
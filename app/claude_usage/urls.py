@@ -14,6 +14,7 @@ urlpatterns = [
     ),
     path("sessions/<str:session_id>/", views.session_detail, name="session-detail"),
     path("refresh/", views.refresh_data, name="refresh-data"),
+    path("refresh/<str:task_id>/", views.refresh_status, name="refresh-status"),
     path("agent-sync/", views.agent_sync_claude_usage, name="agent-sync"),
     # Dashboard & graphing endpoints
     path("timeseries/", views.usage_timeseries, name="usage-timeseries"),
@@ -1,139 +1,232 @@
-from rest_framework.decorators import api_view, permission_classes
+from celery.result import AsyncResult
+from rest_framework.decorators import (
+    api_view,
+    parser_classes,
+    permission_classes,
+    throttle_classes,
+)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, DecimalField, Max, Sum, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime
-from datetime import datetime
+from django.utils.connection import ConnectionProxy
+from datetime import timedelta
+from decimal import Decimal
+from functools import wraps
+from restAPI.utils.caching import cache_key_generator
+from restAPI.utils.throttling import DashboardRateThrottle
 from .models import Project, Session, UsageSnapshot
+from .parsers import OrjsonParser
 from .serializers import (
     ProjectSerializer,
     ProjectListSerializer,
     SessionSerializer,
     UsageSnapshotSerializer,
-    UsageStatsSerializer,
 )
-from .services import ClaudeDataExtractor
+from .services import (
+    SNAPSHOT_ITERATOR_CHUNK_SIZE,
+    ClaudeDataExtractor,
+    import_usage_data,
+    latest_snapshot_window,
+    session_summary,
+)
+from .tasks import refresh_claude_data, sync_agent_usage
+
+# Cached dashboard data lives in the "claude_usage" alias (Redis), so every
+# web process sees the same entries and the same invalidation
+cache = ConnectionProxy(caches, "claude_usage")
+
+# Parsing caches are module-level in services, so one extractor for the
+# default ~/.claude path serves every request
+extractor = ClaudeDataExtractor()
+
+# Seconds a computed usage_stats payload is reused while no snapshots change
+USAGE_STATS_CACHE_TIMEOUT = 300
+
+# Seconds a queued task id stays pollable by the user who queued it; matches
+# Celery's default result expiry
+TASK_OWNER_TIMEOUT = 24 * 60 * 60
+
+# Agent syncs with more messages than this are imported by a Celery task
+AGENT_SYNC_ASYNC_THRESHOLD = 5000
+
+# Seconds dashboard and timeseries responses are reused. They are relative to
+# the current time, so unlike usage_stats they are only kept briefly.
+SNAPSHOT_VIEW_CACHE_TIMEOUT = 15
+
+
+def snapshot_signature():
+    """Count, newest id and newest timestamp of the snapshot table.
+
+    Any import inserts rows with new ids and any cleanup changes the count,
+    so the first two identify the table's state for cache keys.
+    """
+    return UsageSnapshot.objects.aggregate(
+        total_messages=Count("id"),
+        latest_id=Max("id"),
+        latest_timestamp=Max("timestamp"),
+    )
+
+
+def cached_latest_window(signature, window_hours=5):
+    """
+    Latest rate limit window for a snapshot_signature(), cached so the views
+    that show it share one computation until the snapshots change.
+    """
+    cache_key = (
+        f"claude_usage:latest_window:{window_hours}:"
+        f"{signature['total_messages']}:{signature['latest_id']}"
+    )
+    # Wrapped in a tuple so a cached "no window" is told apart from a miss
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+
+    window = latest_snapshot_window(UsageSnapshot.objects.all(), window_hours)
+    cache.set(cache_key, (window,), USAGE_STATS_CACHE_TIMEOUT)
+    return window
+
+
+def task_owner_key(user, task_id):
+    return f"claude_usage:task_owner:{user.pk}:{task_id}"
+
+
+def remember_task(user, task_id):
+    """Record that user queued task_id, so refresh_status will report it"""
+    cache.set(task_owner_key(user, task_id), True, TASK_OWNER_TIMEOUT)
+
+
+def cache_until_snapshots_change(prefix, timeout=SNAPSHOT_VIEW_CACHE_TIMEOUT):
+    """
+    Cache a GET view's response data per query string and snapshot signature.
+
+    Writes change the signature, so a new sync is visible on the next
+    request; the timeout only bounds how stale time-relative values get.
+    The signature is left on request.snapshot_signature for the view.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            signature = request.snapshot_signature = snapshot_signature()
+            cache_key = cache_key_generator(
+                f"claude_usage:{prefix}",
+                request.query_params.dict(),
+                signature["total_messages"],
+                signature["latest_id"],
+            )
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(cache_key, response.data, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
 def usage_stats(request):
     """Get overall usage statistics with rate limit information from database"""
     # Calculate stats from database
-    from django.db.models import Sum
-
-    projects = Project.objects.all()
-    sessions = Session.objects.all()
     snapshots = UsageSnapshot.objects.all()
+    now = timezone.now()
+    window_hours = 5
+
+    signature = snapshot_signature()
+    latest_timestamp = signature["latest_timestamp"]
+    # Syncs can add projects or sessions without touching the snapshots, so
+    # their counts and newest update are part of the key as well
+    counts = Project.objects.aggregate(
+        projects=Count("id", distinct=True),
+        total_sessions=Count("sessions"),
+        sessions_updated_at=Max("sessions__updated_at"),
+    )
+    cache_key = cache_key_generator(
+        "claude_usage:usage_stats",
+        signature["total_messages"],
+        signature["latest_id"],
+        counts["projects"],
+        counts["total_sessions"],
+        counts["sessions_updated_at"],
+    )
 
-    stats = {
-        "total_tokens": snapshots.aggregate(total=Sum("total_tokens"))["total"] or 0,
-        "total_input_tokens": snapshots.aggregate(total=Sum("input_tokens"))["total"]
-        or 0,
-        "total_output_tokens": snapshots.aggregate(total=Sum("output_tokens"))["total"]
-        or 0,
-        "total_cache_creation_tokens": snapshots.aggregate(
-            total=Sum("cache_creation_tokens")
-        )["total"]
-        or 0,
-        "total_cache_read_tokens": snapshots.aggregate(total=Sum("cache_read_tokens"))[
-            "total"
-        ]
-        or 0,
-        "total_sessions": sessions.count(),
-        "total_messages": snapshots.count(),
-        "projects": projects.count(),
-        "projects_data": [],
-    }
-
-    # Calculate rate limit status from database snapshots
-    all_snapshots = list(
-        snapshots.order_by("timestamp").values(
-            "timestamp",
-            "input_tokens",
-            "output_tokens",
-            "cache_creation_tokens",
-            "cache_read_tokens",
+    # Only the data-dependent part is cached; the countdown below uses now
+    stats = cache.get(cache_key)
+    if stats is None:
+        # All snapshot totals in one query
+        totals = snapshots.aggregate(
+            total_tokens=Sum("total_tokens"),
+            total_input_tokens=Sum("input_tokens"),
+            total_output_tokens=Sum("output_tokens"),
+            total_cache_creation_tokens=Sum("cache_creation_tokens"),
+            total_cache_read_tokens=Sum("cache_read_tokens"),
         )
-    )
 
-    if all_snapshots:
-        # Convert to message format for rate limit calculation
-        messages = []
-        for snap in all_snapshots:
-            messages.append(
-                {
-                    "timestamp": snap["timestamp"].isoformat().replace("+00:00", "Z"),
-                    "message": {
-                        "usage": {
-                            "input_tokens": snap["input_tokens"],
-                            "output_tokens": snap["output_tokens"],
-                            "cache_creation_input_tokens": snap[
-                                "cache_creation_tokens"
-                            ],
-                            "cache_read_input_tokens": snap["cache_read_tokens"],
-                        }
-                    },
-                }
-            )
+        stats = {
+            **{field: value or 0 for field, value in totals.items()},
+            "total_sessions": counts["total_sessions"],
+            "total_messages": signature["total_messages"],
+            "projects": counts["projects"],
+            "projects_data": [],
+        }
 
-        # Use extractor for rate limit calculation only
-        extractor = ClaudeDataExtractor()
-        windows = extractor.calculate_rate_limit_windows(messages, window_hours=5)
+        cache.set(cache_key, stats, USAGE_STATS_CACHE_TIMEOUT)
 
-        if windows:
-            latest_window = windows[-1]
-            now = timezone.now()
-            is_within_active_window = now < latest_window["end_time"]
+    # Calculate rate limit status from database snapshots. The latest
+    # window always contains the newest snapshot, so if that is a full
+    # window old the limits have reset and no rows need to be loaded.
+    latest_window = None
+    if latest_timestamp is not None and latest_timestamp > now - timedelta(
+        hours=window_hours
+    ):
+        latest_window = cached_latest_window(signature, window_hours)
 
-            if is_within_active_window:
-                time_until_reset = latest_window["end_time"] - now
-                time_until_reset_seconds = int(time_until_reset.total_seconds())
-                hours = time_until_reset_seconds // 3600
-                minutes = (time_until_reset_seconds % 3600) // 60
+    stats = dict(stats)
+    if latest_timestamp is None:
+        stats.update(
+            {
+                "current_window_tokens": 0,
+                "current_window_start": None,
+                "next_reset_at": None,
+                "time_until_reset_seconds": None,
+                "time_until_reset_human": None,
+                "is_within_active_window": False,
+            }
+        )
+    elif latest_window is not None and now < latest_window["end_time"]:
+        time_until_reset = latest_window["end_time"] - now
+        time_until_reset_seconds = int(time_until_reset.total_seconds())
+        hours = time_until_reset_seconds // 3600
+        minutes = (time_until_reset_seconds % 3600) // 60
 
-                stats.update(
-                    {
-                        "current_window_tokens": latest_window["total_tokens"],
-                        "current_window_start": latest_window["start_time"].isoformat(),
-                        "next_reset_at": latest_window["end_time"].isoformat(),
-                        "time_until_reset_seconds": time_until_reset_seconds,
-                        "time_until_reset_human": f"{hours}h {minutes}m remaining",
-                        "is_within_active_window": True,
-                        "window_details": {
-                            "input_tokens": latest_window["input_tokens"],
-                            "output_tokens": latest_window["output_tokens"],
-                            "cache_creation_tokens": latest_window[
-                                "cache_creation_tokens"
-                            ],
-                            "cache_read_tokens": latest_window["cache_read_tokens"],
-                        },
-                    }
-                )
-            else:
-                stats.update(
-                    {
-                        "current_window_tokens": 0,
-                        "current_window_start": None,
-                        "next_reset_at": None,
-                        "time_until_reset_seconds": None,
-                        "time_until_reset_human": "Limits have reset",
-                        "is_within_active_window": False,
-                    }
-                )
-        else:
-            stats.update(
-                {
-                    "current_window_tokens": 0,
-                    "current_window_start": None,
-                    "next_reset_at": None,
-                    "time_until_reset_seconds": None,
-                    "time_until_reset_human": None,
-                    "is_within_active_window": False,
-                }
-            )
+        stats.update(
+            {
+                "current_window_tokens": latest_window["total_tokens"],
+                "current_window_start": latest_window["start_time"].isoformat(),
+                "next_reset_at": latest_window["end_time"].isoformat(),
+                "time_until_reset_seconds": time_until_reset_seconds,
+                "time_until_reset_human": f"{hours}h {minutes}m remaining",
+                "is_within_active_window": True,
+                "window_details": {
+                    "input_tokens": latest_window["input_tokens"],
+                    "output_tokens": latest_window["output_tokens"],
+                    "cache_creation_tokens": latest_window["cache_creation_tokens"],
+                    "cache_read_tokens": latest_window["cache_read_tokens"],
+                },
+            }
+        )
     else:
         stats.update(
             {
@@ -141,36 +234,66 @@ def usage_stats(request):
                 "current_window_start": None,
                 "next_reset_at": None,
                 "time_until_reset_seconds": None,
-                "time_until_reset_human": None,
+                "time_until_reset_human": "Limits have reset",
                 "is_within_active_window": False,
             }
         )
 
-    serializer = UsageStatsSerializer(stats)
-    return Response(serializer.data)
+    # stats is already JSON-ready with UsageStatsSerializer's field set, so
+    # it is returned as-is rather than re-walked by the serializer
+    return Response(stats)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
 def project_list(request):
     """Get all projects"""
-    projects = Project.objects.all()
+    # The totals are summed in the same query, and rows come back as dicts
+    # the serializer reads by key, so no model instances are built
+    projects = (
+        Project.objects.annotate(
+            total_tokens=Coalesce(Sum("sessions__total_tokens"), 0),
+            total_sessions=Count("sessions"),
+            total_cost=Coalesce(
+                Sum("sessions__total_cost"),
+                Value(Decimal(0)),
+                output_field=DecimalField(),
+            ),
+        )
+        .values(
+            "id",
+            "name",
+            "path",
+            "created_at",
+            "updated_at",
+            "total_tokens",
+            "total_sessions",
+            "total_cost",
+        )
+        .order_by("-updated_at")
+    )
     serializer = ProjectListSerializer(projects, many=True)
     return Response({"projects": serializer.data, "count": len(serializer.data)})
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
 def project_detail(request, project_name):
     """Get detailed info for a specific project"""
     # Try to get from database first
     try:
-        project = Project.objects.get(name=project_name)
+        # Sessions and their snapshots are nested in the serializer, and the
+        # project totals walk the sessions, so load both up front
+        project = Project.objects.prefetch_related("sessions__usage_snapshots").get(
+            name=project_name
+        )
         serializer = ProjectSerializer(project)
         return Response(serializer.data)
     except Project.DoesNotExist:
-        # If not in database, try to get from Claude data
-        extractor = ClaudeDataExtractor()
+        # If not in database, try to get from Claude data. Unchanged session
+        # files are served from the extractor's parse cache.
         project_data = extractor.get_project_data(project_name)
 
         if project_data:
@@ -183,19 +306,24 @@ def project_detail(request, project_name):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
 def session_detail(request, session_id):
     """Get detailed info for a specific session"""
-    session = get_object_or_404(Session, session_id=session_id)
+    session = get_object_or_404(
+        Session.objects.prefetch_related("usage_snapshots"), session_id=session_id
+    )
     serializer = SessionSerializer(session)
     return Response(serializer.data)
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
 def project_sessions(request, project_name):
     """Get all sessions for a specific project"""
     project = get_object_or_404(Project, name=project_name)
-    sessions = project.sessions.all()
+    # Load every session's snapshots in one query instead of one per session
+    sessions = project.sessions.prefetch_related("usage_snapshots")
     serializer = SessionSerializer(sessions, many=True)
     return Response(serializer.data)
 
@@ -203,94 +331,39 @@ def project_sessions(request, project_name):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def refresh_data(request):
-    """Refresh Claude usage data from files"""
+    """Queue a refresh of Claude usage data from files"""
     try:
-        from .tasks import update_claude_data
-
-        # For now, run synchronously. In production, you might want to use Celery
-        extractor = ClaudeDataExtractor()
-        data = extractor.extract_usage_data()
-
-        # Update database with latest data
-        for project_data in data:
-            project, created = Project.objects.get_or_create(
-                name=project_data["project_name"],
-                defaults={"path": f"~/.claude/projects/{project_data['project_name']}"},
-            )
-
-            for session_data in project_data["sessions"]:
-                session, created = Session.objects.get_or_create(
-                    session_id=session_data["session_id"],
-                    project=project,
-                    defaults={
-                        "message_count": session_data["message_count"],
-                        "total_tokens": session_data["total_tokens"],
-                        "total_input_tokens": session_data["total_input_tokens"],
-                        "total_output_tokens": session_data["total_output_tokens"],
-                        "total_cache_creation_tokens": session_data[
-                            "total_cache_creation_tokens"
-                        ],
-                        "total_cache_read_tokens": session_data[
-                            "total_cache_read_tokens"
-                        ],
-                        "created_at": (
-                            session_data["messages"][0]["timestamp"]
-                            if session_data["messages"]
-                            else None
-                        ),
-                    },
-                )
-
-                # Clear existing usage snapshots for this session to avoid duplicates
-                UsageSnapshot.objects.filter(session=session).delete()
-
-                # Create usage snapshots for each message
-                for message in session_data["messages"]:
-                    UsageSnapshot.objects.create(
-                        session=session,
-                        project=project,
-                        input_tokens=message["message"]["usage"].get("input_tokens", 0),
-                        output_tokens=message["message"]["usage"].get(
-                            "output_tokens", 0
-                        ),
-                        cache_creation_tokens=message["message"]["usage"].get(
-                            "cache_creation_input_tokens", 0
-                        ),
-                        cache_read_tokens=message["message"]["usage"].get(
-                            "cache_read_input_tokens", 0
-                        ),
-                        total_tokens=sum(
-                            [
-                                message["message"]["usage"].get("input_tokens", 0),
-                                message["message"]["usage"].get("output_tokens", 0),
-                                message["message"]["usage"].get(
-                                    "cache_creation_input_tokens", 0
-                                ),
-                                message["message"]["usage"].get(
-                                    "cache_read_input_tokens", 0
-                                ),
-                            ]
-                        ),
-                        cost_usd=extractor.calculate_cost(message),
-                        model=message["message"]["model"],
-                        timestamp=message["timestamp"],
-                        request_id=message.get("requestId", ""),
-                        message_id=message["message"].get("id", ""),
-                    )
-
+        task = refresh_claude_data.delay()
+        remember_task(request.user, task.id)
         return Response(
-            {
-                "message": "Data refreshed successfully",
-                "projects_updated": len(data),
-                "total_sessions": sum(len(p["sessions"]) for p in data),
-            }
+            {"message": "Data refresh queued", "task_id": task.id},
+            status=status.HTTP_202_ACCEPTED,
         )
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def refresh_status(request, task_id):
+    """Report the state of a queued refresh, with its counts once finished"""
+    # Only tasks this user queued here are reported; any other id, including
+    # other apps' Celery tasks, is indistinguishable from an unknown one
+    if not cache.get(task_owner_key(request.user, task_id)):
+        return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    result = AsyncResult(task_id)
+    response_data = {"task_id": task_id, "state": result.state}
+    if result.successful():
+        response_data["result"] = result.result
+    elif result.failed():
+        response_data["error"] = "Refresh failed"
+    return Response(response_data)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@parser_classes([OrjsonParser])
 def agent_sync_claude_usage(request):
     """
     Webhook endpoint for remote agents to sync Claude usage data.
@@ -323,8 +396,10 @@ def agent_sync_claude_usage(request):
         ]
     }
     """
+    now = timezone.now()
+    # Parsed outside the try so a malformed body is reported as a 400
+    data = request.data
     try:
-        data = request.data
         projects_data = data.get("projects", [])
 
         if not projects_data:
@@ -333,127 +408,44 @@ def agent_sync_claude_usage(request):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        projects_updated = 0
-        sessions_updated = 0
-        snapshots_created = 0
-
-        extractor = ClaudeDataExtractor()
+        # Reshape the payload into extractor output for the shared importer
+        usage_data = [
+            {
+                "project_name": project_data["name"],
+                "path": project_data.get("path"),
+                "sessions": [
+                    session_summary(session_data["session_id"], messages)
+                    for session_data in project_data.get("sessions", [])
+                    if (messages := session_data.get("messages", []))
+                ],
+            }
+            for project_data in projects_data
+        ]
 
-        for project_data in projects_data:
-            # Get or create project
-            project, created = Project.objects.get_or_create(
-                name=project_data["name"],
-                defaults={
-                    "path": project_data.get(
-                        "path", f"~/.claude/projects/{project_data['name']}"
-                    )
+        message_count = sum(
+            session["message_count"]
+            for project in usage_data
+            for session in project["sessions"]
+        )
+        if message_count > AGENT_SYNC_ASYNC_THRESHOLD:
+            task = sync_agent_usage.delay(usage_data)
+            remember_task(request.user, task.id)
+            return Response(
+                {
+                    "status": "queued",
+                    "message": f"Queued sync of {message_count} messages",
+                    "task_id": task.id,
+                    "timestamp": now.isoformat(),
                 },
+                status=status.HTTP_202_ACCEPTED,
             )
 
-            if created:
-                projects_updated += 1
+        with transaction.atomic():
+            counts = import_usage_data(usage_data, batch_size=1000)
 
-            # Process sessions
-            for session_data in project_data.get("sessions", []):
-                messages = session_data.get("messages", [])
-
-                if not messages:
-                    continue
-
-                # Calculate session totals
-                total_input = sum(
-                    m["message"]["usage"].get("input_tokens", 0) for m in messages
-                )
-                total_output = sum(
-                    m["message"]["usage"].get("output_tokens", 0) for m in messages
-                )
-                total_cache_creation = sum(
-                    m["message"]["usage"].get("cache_creation_input_tokens", 0)
-                    for m in messages
-                )
-                total_cache_read = sum(
-                    m["message"]["usage"].get("cache_read_input_tokens", 0)
-                    for m in messages
-                )
-                total_tokens = (
-                    total_input + total_output + total_cache_creation + total_cache_read
-                )
-
-                # Parse timestamp from first message
-                created_at = None
-                try:
-                    created_at = parse_datetime(
-                        messages[0]["timestamp"].replace("Z", "+00:00")
-                    )
-                except (ValueError, TypeError, KeyError):
-                    created_at = timezone.now()
-
-                # Get or create session
-                session, created = Session.objects.get_or_create(
-                    session_id=session_data["session_id"],
-                    project=project,
-                    defaults={
-                        "message_count": len(messages),
-                        "total_tokens": total_tokens,
-                        "total_input_tokens": total_input,
-                        "total_output_tokens": total_output,
-                        "total_cache_creation_tokens": total_cache_creation,
-                        "total_cache_read_tokens": total_cache_read,
-                        "created_at": created_at,
-                    },
-                )
-
-                if created:
-                    sessions_updated += 1
-                else:
-                    # Update existing session
-                    session.message_count = len(messages)
-                    session.total_tokens = total_tokens
-                    session.total_input_tokens = total_input
-                    session.total_output_tokens = total_output
-                    session.total_cache_creation_tokens = total_cache_creation
-                    session.total_cache_read_tokens = total_cache_read
-                    session.save()
-
-                # Clear existing snapshots to avoid duplicates
-                UsageSnapshot.objects.filter(session=session).delete()
-
-                # Create usage snapshots
-                for message in messages:
-                    try:
-                        timestamp = parse_datetime(
-                            message["timestamp"].replace("Z", "+00:00")
-                        )
-                        usage = message["message"]["usage"]
-                        msg_total_tokens = sum(
-                            [
-                                usage.get("input_tokens", 0),
-                                usage.get("output_tokens", 0),
-                                usage.get("cache_creation_input_tokens", 0),
-                                usage.get("cache_read_input_tokens", 0),
-                            ]
-                        )
-
-                        UsageSnapshot.objects.create(
-                            session=session,
-                            project=project,
-                            input_tokens=usage.get("input_tokens", 0),
-                            output_tokens=usage.get("output_tokens", 0),
-                            cache_creation_tokens=usage.get(
-                                "cache_creation_input_tokens", 0
-                            ),
-                            cache_read_tokens=usage.get("cache_read_input_tokens", 0),
-                            total_tokens=msg_total_tokens,
-                            cost_usd=extractor.calculate_cost(message),
-                            model=message["message"].get("model", "unknown"),
-                            timestamp=timestamp,
-                            request_id=message.get("requestId", ""),
-                            message_id=message["message"].get("id", ""),
-                        )
-                        snapshots_created += 1
-                    except (KeyError, ValueError, TypeError) as e:
-                        # Skip malformed messages
-                        continue
+        projects_updated = counts["projects_created"]
+        sessions_updated = counts["sessions_created"]
+        snapshots_created = counts["snapshots_created"]
 
         return Response(
             {
@@ -462,7 +454,7 @@ def agent_sync_claude_usage(request):
                 "projects_updated": projects_updated,
                 "sessions_updated": sessions_updated,
                 "snapshots_created": snapshots_created,
-                "timestamp": timezone.now().isoformat(),
+                "timestamp": now.isoformat(),
             }
         )
 
@@ -475,12 +467,14 @@ def agent_sync_claude_usage(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
+@cache_until_snapshots_change("usage_timeseries")
 def usage_timeseries(request):
     """
     Get time-series data for graphing token usage over time.
     Returns data points grouped by time intervals.
     """
-    from django.db.models import Sum, Count
+    from django.db.models import Sum, Count, DateTimeField, ExpressionWrapper, F
     from django.db.models.functions import TruncMinute, TruncHour
     from datetime import timedelta
 
@@ -497,41 +491,7 @@ def usage_timeseries(request):
         timestamp__gte=start_time, timestamp__lte=end_time
     ).order_by("timestamp")
 
-    # Group by interval
-    data_points = []  # Initialize to prevent UnboundLocalError
-
-    if interval == "5min":
-        # Group by 5-minute intervals
-        current = start_time
-        while current <= end_time:
-            next_point = current + timedelta(minutes=5)
-            interval_snapshots = snapshots.filter(
-                timestamp__gte=current, timestamp__lt=next_point
-            )
-
-            agg = interval_snapshots.aggregate(
-                total_tokens=Sum("total_tokens"),
-                input_tokens=Sum("input_tokens"),
-                output_tokens=Sum("output_tokens"),
-                cache_creation_tokens=Sum("cache_creation_tokens"),
-                cache_read_tokens=Sum("cache_read_tokens"),
-                message_count=Count("id"),
-            )
-
-            data_points.append(
-                {
-                    "timestamp": current.isoformat(),
-                    "total_tokens": agg["total_tokens"] or 0,
-                    "input_tokens": agg["input_tokens"] or 0,
-                    "output_tokens": agg["output_tokens"] or 0,
-                    "cache_creation_tokens": agg["cache_creation_tokens"] or 0,
-                    "cache_read_tokens": agg["cache_read_tokens"] or 0,
-                    "message_count": agg["message_count"] or 0,
-                }
-            )
-            current = next_point
-
-    elif interval == "1hour":
+    if interval == "1hour":
         hourly_data = (
             snapshots.annotate(hour=TruncHour("timestamp"))
             .values("hour")
@@ -561,14 +521,36 @@ def usage_timeseries(request):
     else:
         # Default to 5min if invalid interval provided
         interval = "5min"
+        step = timedelta(minutes=5)
+        fields = (
+            "total_tokens",
+            "input_tokens",
+            "output_tokens",
+            "cache_creation_tokens",
+            "cache_read_tokens",
+            "message_count",
+        )
+
+        # Every 5-minute interval, including empty ones, up to end_time
+        data_points = []
         current = start_time
         while current <= end_time:
-            next_point = current + timedelta(minutes=5)
-            interval_snapshots = snapshots.filter(
-                timestamp__gte=current, timestamp__lt=next_point
+            data_points.append(
+                {"timestamp": current.isoformat(), **dict.fromkeys(fields, 0)}
             )
-
-            agg = interval_snapshots.aggregate(
+            current += step
+
+        # One GROUP BY per minute instead of one query per interval. Shifting
+        # timestamps back by start_time's seconds puts every interval boundary
+        # on a whole minute, so each shifted minute falls in exactly one interval
+        offset = start_time - start_time.replace(second=0, microsecond=0)
+        shifted = ExpressionWrapper(
+            F("timestamp") - offset, output_field=DateTimeField()
+        )
+        per_minute = (
+            snapshots.annotate(minute=TruncMinute(shifted))
+            .values("minute")
+            .annotate(
                 total_tokens=Sum("total_tokens"),
                 input_tokens=Sum("input_tokens"),
                 output_tokens=Sum("output_tokens"),
@@ -576,19 +558,12 @@ def usage_timeseries(request):
                 cache_read_tokens=Sum("cache_read_tokens"),
                 message_count=Count("id"),
             )
-
-            data_points.append(
-                {
-                    "timestamp": current.isoformat(),
-                    "total_tokens": agg["total_tokens"] or 0,
-                    "input_tokens": agg["input_tokens"] or 0,
-                    "output_tokens": agg["output_tokens"] or 0,
-                    "cache_creation_tokens": agg["cache_creation_tokens"] or 0,
-                    "cache_read_tokens": agg["cache_read_tokens"] or 0,
-                    "message_count": agg["message_count"] or 0,
-                }
-            )
-            current = next_point
+            .order_by()
+        )
+        for row in per_minute:
+            point = data_points[(row["minute"] + offset - start_time) // step]
+            for field in fields:
+                point[field] += row[field]
 
     return Response(
         {
@@ -602,6 +577,8 @@ def usage_timeseries(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([DashboardRateThrottle])
+@cache_until_snapshots_change("dashboard_summary")
 def dashboard_summary(request):
     """
     Get dashboard summary with costs, burn rate, model distribution, and predictions.
@@ -650,17 +627,8 @@ def dashboard_summary(request):
         else 0
     )
 
-    # Get current rate limit window info
-    extractor = ClaudeDataExtractor()
-    all_snapshots_data = list(
-        UsageSnapshot.objects.order_by("timestamp").values(
-            "timestamp",
-            "input_tokens",
-            "output_tokens",
-            "cache_creation_tokens",
-            "cache_read_tokens",
-        )
-    )
+    # Get current rate limit window info, shared with usage_stats via the cache
+    latest_window = cached_latest_window(request.snapshot_signature, window_hours=5)
 
     rate_limit_info = {
         "is_within_active_window": False,
@@ -674,85 +642,80 @@ def dashboard_summary(request):
             "estimated_time_to_limit": None,
         },
     }
-    if all_snapshots_data:
-        messages = []
-        for snap in all_snapshots_data:
-            messages.append(
-                {
-                    "timestamp": snap["timestamp"].isoformat().replace("+00:00", "Z"),
-                    "message": {
-                        "usage": {
-                            "input_tokens": snap["input_tokens"],
-                            "output_tokens": snap["output_tokens"],
-                            "cache_creation_input_tokens": snap[
-                                "cache_creation_tokens"
-                            ],
-                            "cache_read_input_tokens": snap["cache_read_tokens"],
-                        }
+    if latest_window is not None:
+        now = timezone.now()
+        is_within_active_window = now < latest_window["end_time"]
+
+        if is_within_active_window:
+            time_until_reset = latest_window["end_time"] - now
+            time_until_reset_seconds = int(time_until_reset.total_seconds())
+            hours_left = time_until_reset_seconds // 3600
+            minutes_left = (time_until_reset_seconds % 3600) // 60
+
+            # Calculate predictions
+            if burn_rate > 0:
+                # Estimate when tokens will run out (assuming 65,459 token limit for Pro)
+                token_limit = 65459  # Can be parameterized
+                current_usage = latest_window["total_tokens"]
+                tokens_remaining = token_limit - current_usage
+                minutes_until_limit = (
+                    tokens_remaining / burn_rate if burn_rate > 0 else float("inf")
+                )
+
+                rate_limit_info = {
+                    "current_window_tokens": latest_window["total_tokens"],
+                    "current_window_start": latest_window["start_time"].isoformat(),
+                    "next_reset_at": latest_window["end_time"].isoformat(),
+                    "time_until_reset_seconds": time_until_reset_seconds,
+                    "time_until_reset_human": f"{hours_left}h {minutes_left}m",
+                    "is_within_active_window": True,
+                    "predictions": {
+                        "tokens_will_run_out": minutes_until_limit
+                        < time_until_reset_seconds / 60,
+                        "estimated_time_to_limit": (
+                            f"{int(minutes_until_limit // 60)}h {int(minutes_until_limit % 60)}m"
+                            if minutes_until_limit < float("inf")
+                            else "Not reaching limit"
+                        ),
                     },
                 }
-            )
-
-        windows = extractor.calculate_rate_limit_windows(messages, window_hours=5)
-        if windows:
-            latest_window = windows[-1]
-            now = timezone.now()
-            is_within_active_window = now < latest_window["end_time"]
-
-            if is_within_active_window:
-                time_until_reset = latest_window["end_time"] - now
-                time_until_reset_seconds = int(time_until_reset.total_seconds())
-                hours_left = time_until_reset_seconds // 3600
-                minutes_left = (time_until_reset_seconds % 3600) // 60
-
-                # Calculate predictions
-                if burn_rate > 0:
-                    # Estimate when tokens will run out (assuming 65,459 token limit for Pro)
-                    token_limit = 65459  # Can be parameterized
-                    current_usage = latest_window["total_tokens"]
-                    tokens_remaining = token_limit - current_usage
-                    minutes_until_limit = (
-                        tokens_remaining / burn_rate if burn_rate > 0 else float("inf")
-                    )
-
-                    rate_limit_info = {
-                        "current_window_tokens": latest_window["total_tokens"],
-                        "current_window_start": latest_window["start_time"].isoformat(),
-                        "next_reset_at": latest_window["end_time"].isoformat(),
-                        "time_until_reset_seconds": time_until_reset_seconds,
-                        "time_until_reset_human": f"{hours_left}h {minutes_left}m",
-                        "is_within_active_window": True,
-                        "predictions": {
-                            "tokens_will_run_out": minutes_until_limit
-                            < time_until_reset_seconds / 60,
-                            "estimated_time_to_limit": (
-                                f"{int(minutes_until_limit // 60)}h {int(minutes_until_limit % 60)}m"
-                                if minutes_until_limit < float("inf")
-                                else "Not reaching limit"
-                            ),
-                        },
-                    }
 
     # Use active session data if available, otherwise use 6h totals
     if rate_limit_info.get("is_within_active_window"):
         # Get current window snapshots
-        window_start = rate_limit_info["current_window_start"]
+        window_start = latest_window["start_time"]
         window_snapshots = UsageSnapshot.objects.filter(timestamp__gte=window_start)
 
         # Get active session by detecting inactivity gaps (30 minutes)
         # Convert snapshots to message format for session detection
+        # Only the columns used for session detection are fetched, as plain
+        # dicts rather than model instances; timestamps stay datetimes, which
+        # the extractor accepts without a string round-trip
         snapshot_messages = []
-        for snap in window_snapshots.order_by("timestamp"):
+        for snap in (
+            window_snapshots.order_by("timestamp")
+            .values(
+                "timestamp",
+                "model",
+                "input_tokens",
+                "output_tokens",
+                "cache_creation_tokens",
+                "cache_read_tokens",
+            )
+            .iterator(chunk_size=SNAPSHOT_ITERATOR_CHUNK_SIZE)
+        ):
             snapshot_messages.append(
                 {
-                    "timestamp": snap.timestamp.isoformat().replace("+00:00", "Z"),
+                    "timestamp": snap["timestamp"],
                     "message": {
-                        "model": snap.model,
+                        "model": snap["model"],
                         "usage": {
-                            "input_tokens": snap.input_tokens,
-                            "output_tokens": snap.output_tokens,
-                            "cache_creation_input_tokens": snap.cache_creation_tokens,
-                            "cache_read_input_tokens": snap.cache_read_tokens,
+                            "input_tokens": snap["input_tokens"],
+                            "output_tokens": snap["output_tokens"],
+                            "cache_creation_input_tokens": snap[
+                                "cache_creation_tokens"
+                            ],
+                            "cache_read_input_tokens": snap["cache_read_tokens"],
                         },
                     },
                 }
@@ -765,9 +728,7 @@ def dashboard_summary(request):
 
         if active_session and active_session["messages"]:
             # Get timestamps of active session messages
-            session_start_time = datetime.fromisoformat(
-                active_session["messages"][0]["timestamp"].replace("Z", "+00:00")
-            )
+            session_start_time = active_session["messages"][0]["timestamp"]
             session_snapshots = window_snapshots.filter(
                 timestamp__gte=session_start_time
             )
@@ -817,11 +778,8 @@ def dashboard_summary(request):
                 message_count=Count("id"),
             )
 
-            from dateutil import parser
-
-            window_start_dt = parser.isoparse(window_start)
             window_duration_minutes = (
-                timezone.now() - window_start_dt
+                timezone.now() - window_start
             ).total_seconds() / 60
             window_burn_rate = (
                 (window_stats["total_tokens"] or 0) / window_duration_minutes
@@ -22,6 +22,7 @@ class TagViewSet(viewsets.ModelViewSet):
 
 
 class LlmprovidersViewSet(viewsets.ModelViewSet):
-    queryset = Llmproviders.objects.all().order_by("-created_at")
+    # Nested TagSerializer reads every provider's tags; load them in one query
+    queryset = Llmproviders.objects.prefetch_related("tags").order_by("-created_at")
     serializer_class = LlmprovidersSerializer
     permission_classes = [ReadOnlyOrAuthenticated]
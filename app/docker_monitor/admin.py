@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 
 from .models import (
     ContainerStats,
@@ -23,10 +24,17 @@ class DockerHostAdmin(admin.ModelAdmin):
     search_fields = ["name", "hostname"]
     readonly_fields = ["created_at", "last_seen"]
 
+    def get_queryset(self, request):
+        # Count every host's containers in the changelist query itself
+        return super().get_queryset(request).annotate(
+            _container_count=Count("containers")
+        )
+
     def container_count(self, obj):
-        return obj.containers.count()
+        return obj._container_count
 
     container_count.short_description = "Containers"
+    container_count.admin_order_field = "_container_count"
 
 
 @admin.register(DockerContainer)
@@ -41,6 +49,7 @@ class DockerContainerAdmin(admin.ModelAdmin):
         "updated_at",
     ]
     list_filter = ["status", "host", "created_at"]
+    list_select_related = ("host",)
     search_fields = ["name", "container_id", "image"]
     readonly_fields = ["container_id", "created_at", "updated_at"]
 
@@ -67,12 +76,10 @@ class DockerContainerAdmin(admin.ModelAdmin):
 class ContainerStatsAdmin(admin.ModelAdmin):
     list_display = ["container", "cpu_percent", "memory_percent", "timestamp"]
     list_filter = ["timestamp", "container__host"]
+    list_select_related = ("container", "container__host")
     readonly_fields = ["timestamp"]
-
-    def get_queryset(self, request):
-        return (
-            super().get_queryset(request).select_related("container", "container__host")
-        )
+    # Stats tables grow quickly; skip the unfiltered COUNT(*) per page
+    show_full_result_count = False
 
 
 @admin.register(SystemStats)
@@ -85,7 +92,9 @@ class SystemStatsAdmin(admin.ModelAdmin):
         "timestamp",
     ]
     list_filter = ["timestamp", "host"]
+    list_select_related = ("host",)
     readonly_fields = ["timestamp"]
+    show_full_result_count = False
 
     fieldsets = (
         ("Basic Information", {"fields": ("host", "timestamp")}),
@@ -147,9 +156,6 @@ class SystemStatsAdmin(admin.ModelAdmin):
         ("System Info", {"fields": ("boot_time", "process_count")}),
     )
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related("host")
-
 
 @admin.register(ProcessStats)
 class ProcessStatsAdmin(admin.ModelAdmin):
@@ -164,8 +170,10 @@ class ProcessStatsAdmin(admin.ModelAdmin):
         "timestamp",
     ]
     list_filter = ["timestamp", "host", "status", "username"]
+    list_select_related = ("host",)
     search_fields = ["name", "pid", "username", "cmdline"]
     readonly_fields = ["timestamp"]
+    show_full_result_count = False
 
     fieldsets = (
         (
@@ -181,6 +189,3 @@ class ProcessStatsAdmin(admin.ModelAdmin):
             {"fields": ("create_time", "cmdline"), "classes": ("collapse",)},
         ),
     )
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related("host")
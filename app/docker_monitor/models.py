@@ -1,7 +1,27 @@
 from django.db import models
+from django.db.models import Count, Prefetch, Q
 from django.utils import timezone
 
 
+class DockerHostQuerySet(models.QuerySet):
+    def with_container_counts(self):
+        """Annotate the container totals DockerHostSerializer exposes"""
+        return self.annotate(
+            container_count=Count('containers'),
+            running_containers=Count('containers', filter=Q(containers__status='running')),
+        )
+
+    def with_latest_system_stats(self):
+        """Prefetch each host's newest SystemStats row into latest_system_stats_list"""
+        return self.prefetch_related(
+            Prefetch(
+                'system_stats',
+                queryset=SystemStats.objects.order_by('-timestamp')[:1],
+                to_attr='latest_system_stats_list',
+            )
+        )
+
+
 class DockerHost(models.Model):
     name = models.CharField(max_length=100, unique=True)
     hostname = models.CharField(max_length=255)
@@ -19,6 +39,8 @@ class DockerHost(models.Model):
     os_version = models.CharField(max_length=100, blank=True)
     kernel_version = models.CharField(max_length=100, blank=True)
 
+    objects = DockerHostQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} ({self.hostname})"
 
@@ -18,17 +18,26 @@ class DockerHostSerializer(serializers.ModelSerializer):
             'os_name', 'os_version', 'kernel_version', 'latest_system_stats'
         ]
 
+    # Hosts loaded through DockerHost.objects.with_container_counts() carry
+    # both counts as annotations; others fall back to counting per host
     @extend_schema_field(serializers.IntegerField)
     def get_container_count(self, obj) -> int:
+        if hasattr(obj, 'container_count'):
+            return obj.container_count
         return obj.containers.count()
 
     @extend_schema_field(serializers.IntegerField)
     def get_running_containers(self, obj) -> int:
+        if hasattr(obj, 'running_containers'):
+            return obj.running_containers
         return obj.containers.filter(status='running').count()
 
     @extend_schema_field(serializers.DictField)
     def get_latest_system_stats(self, obj) -> Optional[Dict[str, Any]]:
-        latest_stat = obj.system_stats.first()
+        if hasattr(obj, 'latest_system_stats_list'):
+            latest_stat = next(iter(obj.latest_system_stats_list), None)
+        else:
+            latest_stat = obj.system_stats.first()
         if latest_stat:
             return SystemStatsSerializer(latest_stat).data
         return None
@@ -60,7 +69,10 @@ class DockerContainerSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(serializers.DictField)
     def get_latest_stats(self, obj) -> Optional[Dict[str, Any]]:
-        latest_stat = obj.stats.first()
+        if hasattr(obj, 'latest_stats_list'):
+            latest_stat = next(iter(obj.latest_stats_list), None)
+        else:
+            latest_stat = obj.stats.first()
         if latest_stat:
             return ContainerStatsSerializer(latest_stat).data
         return None
@@ -1,6 +1,7 @@
 import docker
 import psutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from django.utils import timezone
 from django.conf import settings
@@ -8,6 +9,10 @@ from .models import DockerHost, DockerContainer, ContainerStats, SystemStats, Pr
 
 logger = logging.getLogger(__name__)
 
+# stats(stream=False) blocks for a sampling interval, so fetch in parallel
+CONTAINER_STATS_WORKERS = 8
+CONTAINER_STATS_BATCH_SIZE = 500
+
 
 class DockerMonitoringService:
     def __init__(self):
@@ -159,26 +164,35 @@ class DockerMonitoringService:
                 status='running'
             )
 
-        stats_collected = 0
-        for container_obj in containers:
-            try:
-                docker_container = self.client.containers.get(container_obj.container_id)
-                stats = docker_container.stats(stream=False)
-
-                stats_data = self._parse_container_stats(stats)
+        containers = list(containers)
+        if not containers:
+            logger.info("Collected stats for 0 containers")
+            return 0
 
-                ContainerStats.objects.create(
-                    container=container_obj,
-                    **stats_data
-                )
-                stats_collected += 1
+        with ThreadPoolExecutor(max_workers=min(CONTAINER_STATS_WORKERS, len(containers))) as executor:
+            pending = [
+                stat for stat in executor.map(self._fetch_container_stats, containers)
+                if stat is not None
+            ]
 
-            except Exception as e:
-                logger.warning(f"Failed to collect stats for {container_obj.name}: {e}")
+        ContainerStats.objects.bulk_create(pending, batch_size=CONTAINER_STATS_BATCH_SIZE)
+        stats_collected = len(pending)
 
         logger.info(f"Collected stats for {stats_collected} containers")
         return stats_collected
 
+    def _fetch_container_stats(self, container_obj):
+        try:
+            docker_container = self.client.containers.get(container_obj.container_id)
+            stats = docker_container.stats(stream=False)
+
+            stats_data = self._parse_container_stats(stats)
+            return ContainerStats(container=container_obj, **stats_data)
+
+        except Exception as e:
+            logger.warning(f"Failed to collect stats for {container_obj.name}: {e}")
+            return None
+
     def _parse_container_stats(self, stats):
         cpu_stats = stats.get('cpu_stats', {})
         precpu_stats = stats.get('precpu_stats', {})
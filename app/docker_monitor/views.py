@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db.models import Prefetch
 from django.utils import timezone
 from datetime import timedelta, datetime
 
@@ -16,7 +17,7 @@ from .services import DockerMonitoringService
 
 
 class DockerHostViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = DockerHost.objects.all()
+    queryset = DockerHost.objects.with_container_counts().with_latest_system_stats()
     serializer_class = DockerHostSerializer
     permission_classes = [IsAuthenticated]
 
@@ -165,7 +166,13 @@ def agent_sync_containers(request):
 
 
 class DockerContainerViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = DockerContainer.objects.select_related('host').prefetch_related('stats')
+    queryset = DockerContainer.objects.select_related('host').prefetch_related(
+        Prefetch(
+            'stats',
+            queryset=ContainerStats.objects.order_by('-timestamp')[:1],
+            to_attr='latest_stats_list',
+        )
+    )
     permission_classes = [IsAuthenticated]
 
     def get_serializer_class(self):
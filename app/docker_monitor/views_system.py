@@ -35,11 +35,15 @@ class SystemStatsViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def latest(self, request):
         """Get latest system stats for all hosts"""
-        hosts = DockerHost.objects.filter(is_active=True)
+        hosts = (
+            DockerHost.objects.with_container_counts()
+            .with_latest_system_stats()
+            .filter(is_active=True)
+        )
         results = []
 
         for host in hosts:
-            latest_stat = host.system_stats.first()
+            latest_stat = next(iter(host.latest_system_stats_list), None)
             if latest_stat:
                 results.append({
                     'host': DockerHostSerializer(host).data,
@@ -99,7 +103,7 @@ def system_dashboard(request, host_id=None):
     try:
         if host_id:
             try:
-                host = DockerHost.objects.get(id=host_id)
+                host = DockerHost.objects.with_container_counts().get(id=host_id)
             except DockerHost.DoesNotExist:
                 return Response({
                     'status': 'error',
@@ -107,9 +111,9 @@ def system_dashboard(request, host_id=None):
                 }, status=status.HTTP_404_NOT_FOUND)
         else:
             # Get the local host or first active host
-            host = DockerHost.objects.filter(is_local=True).first()
+            host = DockerHost.objects.with_container_counts().filter(is_local=True).first()
             if not host:
-                host = DockerHost.objects.filter(is_active=True).first()
+                host = DockerHost.objects.with_container_counts().filter(is_active=True).first()
 
         if not host:
             return Response({
@@ -122,8 +126,8 @@ def system_dashboard(request, host_id=None):
 
         # Get containers summary
         containers_summary = {
-            'total': host.containers.count(),
-            'running': host.containers.filter(status='running').count(),
+            'total': host.container_count,
+            'running': host.running_containers,
             'stopped': host.containers.filter(status='exited').count(),
             'paused': host.containers.filter(status='paused').count(),
         }
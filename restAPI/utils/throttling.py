@@ -40,6 +40,15 @@ class BulkOperationRateThrottle(UserRateThrottle):
     scope = "bulk"
 
 
+class DashboardRateThrottle(UserRateThrottle):
+    """
+    Rate limiting for polled dashboard endpoints.
+    Allows frequent refreshes while capping aggregation load per user.
+    """
+
+    scope = "dashboard"
+
+
 class AdminRateThrottle(UserRateThrottle):
     """
     Rate limiting for admin operations.
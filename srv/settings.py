@@ -138,6 +138,7 @@ REST_FRAMEWORK = {
         "upload": "50/hour",  # File uploads: 50 per hour
         "bulk": "10/hour",  # Bulk operations: 10 per hour
         "admin": "200/hour",  # Admin operations: 200 per hour
+        "dashboard": "120/min",  # Polled dashboard reads: 120 per minute
         "sustained": "5000/day",  # Daily limit: 5000 requests per day
         "database": "100/hour",  # Database heavy operations: 100 per hour
     },
@@ -206,6 +207,13 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_ENABLE_UTC = True
+# Long-running Claude usage imports get their own queue and worker so they
+# cannot hold up the short periodic tasks
+CELERY_TASK_ROUTES = {
+    "app.claude_usage.tasks.ingest_project": {"queue": "sync"},
+    "app.claude_usage.tasks.refresh_claude_data": {"queue": "sync"},
+    "app.claude_usage.tasks.sync_agent_usage": {"queue": "sync"},
+}
 
 # * Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -234,6 +242,18 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# * Caches: the default stays per-process; Claude usage dashboards share
+# their cached results across web and worker processes through Redis
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "claude_usage": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_HOST", "redis://redis:6379/0"),
+        "KEY_PREFIX": "claude_usage",
+    },
+}
 # * Gotify settings for push notifications
 GOTIFY_URL = os.getenv("GOTIFY_URL")  # Your Gotify URL
 GOTIFY_TOKEN = os.getenv("GOTIFY_TOKEN")  # Your Gotify application token
@@ -375,6 +395,7 @@ if not IS_DOCKER and current_ip == DEV_IP:
     CHANNEL_LAYERS["default"]["CONFIG"]["hosts"] = [
         f"redis://{os.getenv('LOCAL_PROD_IP')}:6379/0"
     ]
+    CACHES["claude_usage"]["LOCATION"] = f"redis://{os.getenv('LOCAL_PROD_IP')}:6379/0"
 else:
     print(
         "Running in PRODUCTION (Docker), using PostgreSQL and Redis via Docker network. DEBUG=False"